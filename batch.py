@@ -0,0 +1,159 @@
+"""
+命令行批量生成入口，无需启动图形界面。
+
+示例:
+    python batch.py 成绩单.pdf 获奖证书.jpg 个人陈述.docx -s 北京大学 -s 清华大学 -o 输出目录 -j 4
+"""
+import sys
+import os
+import argparse
+import traceback
+
+from engine import (PacketBuilder, SUPPORTED_EXTENSIONS, EXECUTOR_KINDS, default_workers, packet_file_name,
+                    validate_school_names)
+from budget import build_within_budget
+from images import DEFAULT_TARGET_DPI, DEFAULT_JPEG_QUALITY
+from cache import ConversionCache, DEFAULT_CACHE_SIZE
+from metadata import MetadataIndex
+from profiling import BuildProfile
+from converters import BACKENDS, create_pool
+
+
+# --max-size 降到最低一级仍超过上限时的退出码（输出文件照常写出）
+EXIT_OVER_BUDGET = 3
+
+
+def read_lines(path):
+    """读取文本文件中的非空行（用于院校列表或材料列表文件）"""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def print_progress(percent, message):
+    print(f"[{percent:3d}%] {message}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='夏令营申请材料批量生成器（命令行版）')
+    parser.add_argument('materials', nargs='*', help='按最终顺序排列的材料文件')
+    parser.add_argument('-m', '--materials-file', help='材料列表文件，每行一个路径，按最终顺序排列')
+    parser.add_argument('-s', '--school', action='append', default=[], help='目标院校名称，可重复指定')
+    parser.add_argument('-S', '--schools-file', help='院校列表文件，每行一个院校名称')
+    parser.add_argument('-o', '--output-dir', default='.', help='输出目录（默认当前目录）')
+    parser.add_argument('-t', '--template', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'surface.docx'),
+                        help='封面与目录模板（默认使用程序目录下的 surface.docx）')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='并行生成材料包的进程数（默认 1）')
+    parser.add_argument('-c', '--convert-workers', type=int, default=default_workers(),
+                        help='并行转换材料的数量（默认 %(default)s）')
+    parser.add_argument('--convert-executor', choices=EXECUTOR_KINDS, default='thread',
+                        help='图片转换使用线程池还是进程池（默认 %(default)s）')
+    parser.add_argument('--image-dpi', type=int, default=DEFAULT_TARGET_DPI,
+                        help='图片嵌入的目标分辨率，0 表示保留原始分辨率（默认 %(default)s）')
+    parser.add_argument('--jpeg-quality', type=int, default=DEFAULT_JPEG_QUALITY,
+                        help='重新编码 JPEG 时的质量 1-95（默认 %(default)s）')
+    parser.add_argument('--converter', choices=sorted(BACKENDS),
+                        help='Word 转换后端（默认：Windows 上使用 Word，其他平台使用 LibreOffice）')
+    parser.add_argument('--cache-dir', help='转换缓存目录（默认位于用户目录下）')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help='转换缓存大小上限，单位 MB（默认 %(default)s）')
+    parser.add_argument('--no-cache', action='store_true', help='不使用转换缓存')
+    parser.add_argument('--incremental', action='store_true',
+                        help='只在上次的输出末尾追加有变化的部分，比完整生成快；被替换或删除的材料仍留在文件中、'
+                             '可以被恢复，文件也随每次更新变大，只适合自己预览，不要提交（默认总是完整重写）')
+    parser.add_argument('--low-memory', action='store_true',
+                        help='始终使用内存有界的流式合并（默认只在材料总大小超过 256MB 时自动使用）')
+    parser.add_argument('--max-size', type=float, metavar='MB',
+                        help='输出大小上限，超出时自动降低各图片的分辨率和 JPEG 质量，并打印每张图片选用的参数；'
+                             f'仍超过上限时以退出码 {EXIT_OVER_BUDGET} 结束')
+    parser.add_argument('--optimize', action='store_true',
+                        help='写出前合并重复对象、压缩内容流并使用对象流以减小文件，打印节省的字节数（输出不再支持增量更新）')
+    parser.add_argument('--profile', action='store_true',
+                        help='记录各阶段和各文件的耗时、CPU、进程内存峰值和读写量，结束时打印汇总表')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='另外用 tracemalloc 记录各阶段新增内存的峰值（隐含 --profile；会明显拖慢生成，耗时不再可信）')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='同时把计量导出为 Chrome trace 文件，可用 chrome://tracing 或 ui.perfetto.dev 打开（隐含 --profile）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    materials = list(args.materials)
+    if args.materials_file:
+        materials.extend(read_lines(args.materials_file))
+    schools = list(args.school)
+    if args.schools_file:
+        schools.extend(read_lines(args.schools_file))
+
+    if not materials:
+        print('错误: 请至少指定一个材料文件。', file=sys.stderr)
+        return 2
+    if not schools:
+        print('错误: 请至少指定一个目标院校名称。', file=sys.stderr)
+        return 2
+    for path in materials:
+        if not os.path.exists(path):
+            print(f"错误: 材料文件不存在: {path}", file=sys.stderr)
+            return 2
+        if os.path.splitext(path)[1].lower() not in SUPPORTED_EXTENSIONS:
+            print(f"错误: 不支持的文件格式: {path}", file=sys.stderr)
+            return 2
+    try:
+        validate_school_names(schools)
+    except Exception as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    if not os.path.exists(args.template):
+        print(f"错误: 未找到模板文件 {args.template}", file=sys.stderr)
+        return 2
+
+    temp_dir = os.path.join(os.path.abspath(args.output_dir), "temp_conversion")
+    cache = None if args.no_cache else ConversionCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    metadata = None if args.no_cache else MetadataIndex(args.cache_dir)
+    converter = create_pool(args.converter)
+    profile = BuildProfile(trace_memory=args.profile_memory) if args.profile or args.profile_memory or args.trace else None
+    builder = PacketBuilder(args.template, temp_dir, progress_callback=print_progress, cache=cache, converter=converter,
+                            workers=args.convert_workers, executor_kind=args.convert_executor,
+                            target_dpi=args.image_dpi or None, jpeg_quality=args.jpeg_quality,
+                            incremental=args.incremental, metadata=metadata, profile=profile,
+                            streaming=True if args.low_memory else None, optimize=args.optimize)
+    if profile is not None:
+        profile.start()
+    try:
+        if args.max_size:
+            os.makedirs(args.output_dir, exist_ok=True)
+            jobs = [(school_name, os.path.join(args.output_dir, packet_file_name(school_name))) for school_name in schools]
+            report = build_within_budget(builder, materials, jobs, int(args.max_size * 1024 * 1024))
+            print(report.summary())
+            results = dict(jobs)
+        else:
+            report = None
+            results = builder.build_many(materials, schools, args.output_dir, workers=args.workers)
+    except Exception as e:
+        traceback.print_exc()
+        print(f"生成过程中出现问题，操作已中断: {e}", file=sys.stderr)
+        return 1
+    finally:
+        builder.cleanup()
+        converter.close()
+        if profile is not None:
+            # 失败时也输出已记录的部分，便于定位卡在哪个阶段或文件
+            profile.stop()
+            print(profile.summary_table())
+            if args.trace:
+                profile.export_trace(args.trace)
+                print(f"trace 已写入: {args.trace}")
+
+    for school_name in schools:
+        print(f"{school_name}: {results[school_name]}")
+    if cache is not None:
+        print(cache.stats_text())
+    if report is not None and not report.met:
+        print(f"错误: 输出仍超过 {args.max_size} MB 的上限。", file=sys.stderr)
+        return EXIT_OVER_BUDGET
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
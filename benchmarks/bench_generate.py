@@ -0,0 +1,249 @@
+"""
+生成流程基准：用合成的材料语料分阶段计时，结果保存为 JSON，并可与基线结果比较。
+
+语料按目标页数合成并按页数缓存在语料目录中（内容由固定随机种子决定，重复运行完全相同）：
+多页 PDF（每 5 页一张横向页）、大尺寸 JPEG / PNG 扫描件，以及由假转换后端转换的 docx。
+计时的阶段与图形界面 generate_final_pdf 的完整生成一致：
+    convert    材料转换、封面模板转换和页数统计（PacketBuilder.prepare_content，不使用缓存）
+    toc        渲染封面和目录页
+    merge      合并各材料的页面
+    numbering  添加页码
+    write      序列化并写出最终文件
+
+用法:
+    python benchmarks/bench_generate.py [页数 ...] [--repeat 3] [--output 结果.json]
+                                        [--baseline 基线.json] [--threshold 0.2]
+与基线相比任一阶段变慢超过阈值时标记为退化，并以退出码 1 结束。
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import functools
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docx import Document
+from PIL import Image
+from pypdf import PdfWriter
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4, landscape
+
+from converters import ConverterPool, FakeBackend
+from engine import PacketBuilder, append_segments, add_page_numbers
+
+RESULTS_VERSION = 1
+DEFAULT_SIZES = [10, 100, 1000]
+STAGES = ['convert', 'toc', 'merge', 'numbering', 'write']
+
+# 语料构成：按页数计的比例，其余为多页 PDF
+WORD_SHARE = 0.1
+IMAGE_SHARE = 0.1
+PAGES_PER_PDF = 10
+PAGES_PER_WORD = 2
+SCAN_SIZE = (2480, 3508)  # A4 300dpi
+
+# 耗时差小于这个秒数时不算退化，避免极短阶段的计时噪声
+MIN_REGRESSION_SECONDS = 0.01
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'surface.docx')
+
+
+def default_corpus_dir():
+    return os.path.join(tempfile.gettempdir(), 'scmg-bench-corpus')
+
+
+def make_pdf(path, page_count, rng):
+    c = canvas.Canvas(path)
+    for i in range(page_count):
+        c.setPageSize(landscape(A4) if i % 5 == 4 else A4)
+        c.setFont('Helvetica', 11)
+        for line in range(40):
+            c.drawString(72, 760 - line * 16, ' '.join(f"{rng.random():.6f}" for _ in range(6)))
+        c.showPage()
+    c.save()
+
+
+def make_scan(path, rng):
+    """带噪点的大尺寸扫描件；噪点让 JPEG 体积接近真实扫描"""
+    size = SCAN_SIZE if rng.random() < 0.7 else SCAN_SIZE[::-1]
+    img = Image.effect_noise(size, 24).convert('RGB')
+    if path.endswith('.png'):
+        img = img.quantize(16).convert('RGB')
+    img.save(path)
+
+
+def make_docx(path, rng):
+    doc = Document()
+    for _ in range(20):
+        doc.add_paragraph(' '.join(f"{rng.random():.6f}" for _ in range(8)))
+    doc.save(path)
+
+
+def build_corpus(page_count, corpus_dir=None):
+    """合成总计约 page_count 页的材料，已存在时直接复用；返回按生成顺序排列的材料路径"""
+    directory = os.path.join(corpus_dir or default_corpus_dir(), f"{page_count}p")
+    done_marker = os.path.join(directory, '.complete')
+    rng = random.Random(page_count)
+    plan = []
+    word_count = max(1, round(page_count * WORD_SHARE / PAGES_PER_WORD))
+    image_count = max(1, round(page_count * IMAGE_SHARE))
+    remaining = max(1, page_count - word_count * PAGES_PER_WORD - image_count)
+    for i in range(word_count):
+        plan.append((f"w{i:04d}.docx", 'word', 0))
+    for i in range(image_count):
+        plan.append((f"s{i:04d}.{'png' if i % 4 == 3 else 'jpg'}", 'image', 0))
+    for i in range(0, remaining, PAGES_PER_PDF):
+        plan.append((f"p{i // PAGES_PER_PDF:04d}.pdf", 'pdf', min(PAGES_PER_PDF, remaining - i)))
+    rng.shuffle(plan)
+
+    paths = [os.path.join(directory, name) for name, _, _ in plan]
+    if os.path.exists(done_marker):
+        return paths
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    for path, (_, kind, pages) in zip(paths, plan):
+        if kind == 'pdf':
+            make_pdf(path, pages, rng)
+        elif kind == 'image':
+            make_scan(path, rng)
+        else:
+            make_docx(path, rng)
+    open(done_marker, 'w').close()
+    return paths
+
+
+def run_once(material_paths, work_dir, workers=1):
+    """按完整生成的步骤执行一遍，返回 ({阶段: 秒}, 总页数)"""
+    converter = ConverterPool(functools.partial(FakeBackend, pages=PAGES_PER_WORD))
+    builder = PacketBuilder(TEMPLATE_PATH, os.path.join(work_dir, 'work'), converter=converter,
+                            workers=workers, incremental=False)
+    timings = {}
+    try:
+        start = time.perf_counter()
+        builder.prepare_content(material_paths)
+        timings['convert'] = time.perf_counter() - start
+
+        writer = PdfWriter()
+        start = time.perf_counter()
+        builder.cover.render(writer, '基准大学', builder.toc_entries)
+        timings['toc'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        append_segments(writer, builder.segments, builder._readers)
+        timings['merge'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        add_page_numbers(writer)
+        timings['numbering'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(os.path.join(work_dir, 'packet.pdf'), 'wb') as f:
+            writer.write(f)
+        timings['write'] = time.perf_counter() - start
+        return timings, len(writer.pages)
+    finally:
+        builder.cleanup()
+        converter.close()
+
+
+def run_benchmark(sizes, repeat=3, workers=1, corpus_dir=None):
+    results = {}
+    for size in sizes:
+        material_paths = build_corpus(size, corpus_dir)
+        runs = []
+        for _ in range(repeat):
+            work_dir = tempfile.mkdtemp(prefix='scmg-bench-')
+            try:
+                timings, page_count = run_once(material_paths, work_dir, workers)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            runs.append(timings)
+        stages = {stage: statistics.median(run[stage] for run in runs) for stage in STAGES}
+        results[str(size)] = {
+            'materials': len(material_paths),
+            'pages': page_count,
+            'stages': stages,
+            'total': sum(stages.values()),
+            'runs': runs,
+        }
+    return {
+        'version': RESULTS_VERSION,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'workers': workers,
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """返回退化列表 [(页数, 阶段, 基线秒, 当前秒)]；只比较两边都有的规模"""
+    regressions = []
+    for size, result in current['results'].items():
+        old = baseline.get('results', {}).get(size)
+        if old is None:
+            continue
+        for stage in STAGES + ['total']:
+            new_seconds = result['total'] if stage == 'total' else result['stages'][stage]
+            old_seconds = old['total'] if stage == 'total' else old['stages'].get(stage)
+            if old_seconds is None:
+                continue
+            if new_seconds > old_seconds * (1 + threshold) and new_seconds - old_seconds > MIN_REGRESSION_SECONDS:
+                regressions.append((size, stage, old_seconds, new_seconds))
+    return regressions
+
+
+def print_table(report, baseline=None):
+    header = f"{'规模':>6} {'页数':>6} " + ' '.join(f"{stage:>10}" for stage in STAGES) + f" {'合计':>9}"
+    print(header)
+    for size, result in report['results'].items():
+        cells = ' '.join(f"{result['stages'][stage]:>10.3f}" for stage in STAGES)
+        print(f"{size:>6} {result['pages']:>6} {cells} {result['total']:>9.3f}")
+        old = (baseline or {}).get('results', {}).get(size)
+        if old is not None:
+            ratios = ' '.join(f"{result['stages'][stage] / old['stages'][stage]:>9.2f}x"
+                              if old['stages'].get(stage) else f"{'-':>10}" for stage in STAGES)
+            print(f"{'':>6} {'对基线':>6} {ratios} {result['total'] / old['total']:>8.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成流程分阶段基准')
+    parser.add_argument('sizes', nargs='*', type=int, help=f"语料总页数（默认 {' '.join(map(str, DEFAULT_SIZES))}）")
+    parser.add_argument('--repeat', type=int, default=3, help='每个规模重复次数，取中位数（默认 3）')
+    parser.add_argument('--workers', type=int, default=1, help='并行转换数（默认 1）')
+    parser.add_argument('--corpus-dir', help='合成语料的存放目录（默认位于系统临时目录）')
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    parser.add_argument('--baseline', help='与之比较的基线结果 JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='变慢超过这个比例视为退化（默认 0.2）')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.sizes or DEFAULT_SIZES, max(1, args.repeat), args.workers, args.corpus_dir)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        for size, stage, old_seconds, new_seconds in regressions:
+            print(f"退化: {size} 页 {stage} {old_seconds:.3f}s -> {new_seconds:.3f}s")
+        if regressions:
+            return 1
+        print("未发现退化。")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
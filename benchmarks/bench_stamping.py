@@ -0,0 +1,80 @@
+"""
+页码盖印基准：比较逐页生成 reportlab 覆盖层再 merge_page 的旧做法
+与直接写入内容流的 PageNumberStamper，在 100 / 1000 页上的单页耗时。
+
+用法:
+    python benchmarks/bench_stamping.py [页数 ...]
+"""
+import os
+import io
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pypdf import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.units import inch
+
+from stamping import PageNumberStamper
+
+
+def make_document(page_count):
+    """生成纵向、横向（已旋转）交替的测试文档"""
+    packet = io.BytesIO()
+    c = canvas.Canvas(packet)
+    for i in range(page_count):
+        c.setPageSize(landscape(A4) if i % 5 == 4 else A4)
+        c.drawString(72, 72, f"page {i + 1}")
+        c.showPage()
+    c.save()
+    packet.seek(0)
+    writer = PdfWriter()
+    for page in PdfReader(packet).pages:
+        if page.mediabox.width > page.mediabox.height:
+            page.rotate(90)
+        writer.add_page(page)
+    return writer
+
+
+def stamp_with_overlays(writer):
+    """旧做法：每页新建画布、BytesIO 和 PdfReader 后 merge_page"""
+    for i, page in enumerate(writer.pages):
+        packet = io.BytesIO()
+        page_width = page.mediabox.width
+        page_height = page.mediabox.height
+        c = canvas.Canvas(packet, pagesize=(page_width, page_height))
+        c.setFont('Helvetica', 9)
+        c.drawCentredString(float(page_width) / 2, 0.5 * inch, str(i + 1))
+        c.save()
+        packet.seek(0)
+        page.merge_page(PdfReader(packet).pages[0])
+
+
+def stamp_with_stamper(writer):
+    PageNumberStamper(writer).stamp_all()
+
+
+def measure(stamp, page_count):
+    writer = make_document(page_count)
+    start = time.perf_counter()
+    stamp(writer)
+    stamp_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    writer.write(io.BytesIO())
+    write_seconds = time.perf_counter() - start
+    return stamp_seconds, write_seconds
+
+
+def main(argv=None):
+    sizes = [int(arg) for arg in (argv or sys.argv[1:])] or [100, 1000]
+    print(f"{'页数':>6} {'方法':<10} {'盖印总耗时':>10} {'单页(ms)':>10} {'写出(s)':>8}")
+    for page_count in sizes:
+        for name, stamp in (('overlay', stamp_with_overlays), ('stamper', stamp_with_stamper)):
+            stamp_seconds, write_seconds = measure(stamp, page_count)
+            print(f"{page_count:>6} {name:<10} {stamp_seconds:>10.3f} {stamp_seconds / page_count * 1000:>10.3f} {write_seconds:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
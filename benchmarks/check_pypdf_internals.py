@@ -0,0 +1,127 @@
+"""
+pypdf 内部接口的兼容性检查。流式合并、增量更新、输出优化和分块序列化用到了 pypdf 的几个内部属性，
+并假定 IndirectObject 每次用一次 write 写出完整的 b"N G R"。升级 pypdf 后运行本脚本，
+任一假设不再成立即打印原因并以退出码 1 结束。
+
+用法:
+    python benchmarks/check_pypdf_internals.py
+"""
+import io
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pypdf
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4, landscape
+
+from stamping import PageNumberStamper
+from streaming import StreamingPdfWriter, check_reference_recording, serialize_chunk
+
+# README 中固定的版本范围
+SUPPORTED_MAJOR_VERSIONS = (6,)
+
+
+def make_material(path):
+    """带共用字体、横向页和链接注释的小文档，覆盖克隆时会产生的各种引用"""
+    c = canvas.Canvas(path, pagesize=A4)
+    for i in range(6):
+        size = landscape(A4) if i % 3 == 2 else A4
+        c.setPageSize(size)
+        c.setFont('Helvetica', 12)
+        c.drawString(72, 720, f"page {i + 1}")
+        c.linkURL('https://example.com', (72, 700, 200, 730))
+        c.showPage()
+    c.save()
+
+
+def count_references(obj):
+    """递归统计对象中直接写出的 IndirectObject 个数"""
+    if isinstance(obj, IndirectObject):
+        return 1
+    if isinstance(obj, (DictionaryObject, StreamObject)):
+        return sum(count_references(value) for value in obj.values())
+    if isinstance(obj, ArrayObject):
+        return sum(count_references(value) for value in obj)
+    return 0
+
+
+def check(results, description, condition):
+    results.append((description, bool(condition)))
+
+
+def main():
+    results = []
+    major = int(pypdf.__version__.split('.')[0])
+    check(results, f"pypdf {pypdf.__version__} 在支持的主版本 {SUPPORTED_MAJOR_VERSIONS} 内", major in SUPPORTED_MAJOR_VERSIONS)
+
+    root = tempfile.mkdtemp(prefix='scmg-pypdf-')
+    try:
+        material = os.path.join(root, 'material.pdf')
+        make_material(material)
+
+        writer = PdfWriter()
+        check(results, "PdfWriter._objects 是列表", isinstance(getattr(writer, '_objects', None), list))
+        check(results, "PdfWriter._id_translated 是字典", isinstance(getattr(writer, '_id_translated', None), dict))
+        check(results, "PdfWriter.flattened_pages 可以清空", hasattr(getattr(writer, 'flattened_pages', None), 'clear'))
+        check(results, "PdfWriter._info 指向文档信息", getattr(writer, '_info', None) is not None)
+        ref = writer._add_object(DictionaryObject())
+        check(results, "PdfWriter._add_object 返回新对象的引用",
+              isinstance(ref, IndirectObject) and ref.idnum == len(writer._objects))
+
+        with open(material, 'rb') as f:
+            reader = PdfReader(f)
+            pages = list(reader.pages)
+            check(results, "PdfReader.resolved_objects 是字典", isinstance(getattr(reader, 'resolved_objects', None), dict))
+            check(results, "PdfReader._startxref 是交叉引用表的位置", isinstance(getattr(reader, '_startxref', None), int))
+
+            try:
+                check_reference_recording()
+                check(results, "IndirectObject 一次写出完整的 N G R", True)
+            except Exception:
+                check(results, "IndirectObject 一次写出完整的 N G R", False)
+
+            # 真实的一块：记下的引用个数应与对象中的引用个数相同，且每处记下的数据就是编号本身
+            output = StreamingPdfWriter(os.path.join(root, 'out.pdf'))
+            chunk_writer = output.new_chunk()
+            for page in pages:
+                chunk_writer.add_page(page)
+            stamper = PageNumberStamper(chunk_writer)
+            number_ids = [stamper.stamp(page, n).idnum for n, page in enumerate(chunk_writer.pages, start=1)]
+            first_id = output.next_id
+            expected = sum(count_references(obj) for obj in chunk_writer._objects[first_id - 1:] if obj is not None)
+            chunk = serialize_chunk(chunk_writer, first_id, number_ids)
+        recorded = sum(len(references) for _, _, references in chunk.objects)
+        check(results, f"序列化时记下全部 {expected} 个对象引用（实际 {recorded} 个）", recorded == expected)
+        check(results, "记下的位置正好是引用的编号",
+              all(data[position:position + length] == str(idnum).encode()
+                  for _, data, references in chunk.objects for position, length, idnum in references))
+
+        # 平移编号后写出的文件应能正常打开，页数和页面文字不变
+        output.next_id += 7
+        output.write_serialized(chunk)
+        output.close()
+        with open(output.path, 'rb') as f:
+            data = f.read()
+        shifted = PdfReader(io.BytesIO(data), strict=True)
+        texts = [page.extract_text() for page in shifted.pages]
+        check(results, "平移编号后写出的文件可以严格解析，页面文字和页码正确",
+              len(texts) == len(pages) and all(f"page {n}" in text and text.rstrip().endswith(str(n))
+                                               for n, text in enumerate(texts, start=1)))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    failed = False
+    for description, passed in results:
+        print(f"{'通过' if passed else '失败'}  {description}")
+        failed = failed or not passed
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+界面冷启动的时间预算检查：在新的解释器中导入 main、创建主窗口并完成首次绘制，重复若干次取中位数。
+同时用 python -X importtime 记录各模块的导入耗时，列出最慢的几个顶层导入，
+并检查启动时没有提前导入生成才用得到的重量级模块（它们应当在窗口显示后于后台预加载）。
+中位数超过预算或提前导入了重量级模块时以退出码 1 结束。
+
+用法:
+    python benchmarks/check_startup.py [--budget 0.5] [--repeat 5] [--top 10]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_BUDGET_SECONDS = 0.5
+# 启动时不应导入的模块：PDF 处理、图片、Word 和 Windows COM 相关的库，以及依赖它们的 engine
+DEFERRED_MODULES = ['engine', 'pypdf', 'reportlab', 'PIL', 'docx', 'win32com', 'fonts']
+
+# 在子进程中执行；计时从解释器开始执行这段代码算起，到主窗口首次绘制完成为止
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import sys, json
+sys.path.insert(0, {root!r})
+from PyQt6.QtWidgets import QApplication
+import main
+app = QApplication(sys.argv)
+window = main.MainWindow()
+app.processEvents()
+elapsed = time.perf_counter() - start
+loaded = [name for name in {deferred!r} if name in sys.modules]
+print(json.dumps({{'seconds': elapsed, 'loaded': loaded}}))
+"""
+
+
+def run_once(importtime=False):
+    """返回 (结果字典, importtime 输出)；QT_QPA_PLATFORM 未设置时使用 offscreen，不弹出窗口"""
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', STARTUP_SCRIPT.format(root=ROOT, deferred=DEFERRED_MODULES)]
+    completed = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', env=env, cwd=ROOT)
+    if completed.returncode != 0:
+        raise Exception(f"启动失败:\n{completed.stderr}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result, completed.stderr
+
+
+def slowest_imports(importtime_output, top):
+    """解析 -X importtime 的输出，返回累计耗时最长的顶层导入 [(模块, 秒)]"""
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, _, cumulative_us, name = line.replace('import time:', '|', 1).split('|')
+        if name[1:].startswith(' '):
+            continue  # 只看顶层导入，嵌套导入已计入其累计耗时
+        imports.append((name.strip(), int(cumulative_us) / 1e6))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='检查界面冷启动时间是否在预算之内')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS, help='启动时间预算，单位秒（默认 %(default)s）')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数，取中位数（默认 %(default)s）')
+    parser.add_argument('--top', type=int, default=10, help='列出最慢的顶层导入个数（默认 %(default)s）')
+    args = parser.parse_args(argv)
+
+    # 第一次运行会编译 .pyc，不计入结果
+    run_once()
+    timings, loaded = [], set()
+    for _ in range(max(1, args.repeat)):
+        result, _ = run_once()
+        timings.append(result['seconds'])
+        loaded.update(result['loaded'])
+    _, importtime_output = run_once(importtime=True)
+
+    print(f"{'顶层导入':<36} {'累计(s)':>9}")
+    for name, seconds in slowest_imports(importtime_output, args.top):
+        print(f"{name:<36} {seconds:>9.3f}")
+    median = statistics.median(timings)
+    print(f"\n启动到首次绘制: 中位数 {median:.3f}s，最短 {min(timings):.3f}s，最长 {max(timings):.3f}s（预算 {args.budget:g}s）")
+
+    failed = False
+    if loaded:
+        print(f"启动时提前导入了: {', '.join(sorted(loaded))}")
+        failed = True
+    if median > args.budget:
+        print("超出启动时间预算。")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+流式合并的内存上限检查：合成每页带一张独立“扫描”图片的大文档，分别以不同的总页数流式生成，
+用 tracemalloc 记录生成过程中的内存峰值，任一规模超过上限即以退出码 1 结束。
+峰值应只取决于块大小，不随总页数增长。加 --compare 时同时测量普通（全部留在内存中）合并作对照。
+
+用法:
+    python benchmarks/check_streaming_memory.py [页数 ...] [--ceiling 64] [--compare]
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+
+import engine
+from converters import create_pool
+from engine import PacketBuilder
+
+DEFAULT_SIZES = [200, 1000]
+DEFAULT_CEILING_MB = 64
+PAGES_PER_FILE = 100
+SCAN_PIXELS = (240, 320)
+
+
+def make_scanned_pdf(path, page_count, seed):
+    """每页一张不可压缩的噪点图片，模拟逐页扫描的成绩单"""
+    c = canvas.Canvas(path, pagesize=A4)
+    for i in range(page_count):
+        img = Image.effect_noise(SCAN_PIXELS, 40 + (seed + i) % 20).convert('RGB')
+        c.drawImage(ImageReader(img), 36, 36, A4[0] - 72, A4[1] - 72)
+        c.showPage()
+    c.save()
+
+
+def build_corpus(directory, page_count):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, start in enumerate(range(0, page_count, PAGES_PER_FILE)):
+        path = os.path.join(directory, f"scan{i:03d}.pdf")
+        make_scanned_pdf(path, min(PAGES_PER_FILE, page_count - start), seed=i)
+        paths.append(path)
+    return paths
+
+
+def measure(material_paths, work_dir, streaming):
+    """返回 (生成过程中 tracemalloc 记录的内存峰值字节数, 输出文件大小)"""
+    converter = create_pool('fake')
+    builder = PacketBuilder(os.path.join(os.path.dirname(engine.__file__), 'surface.docx'),
+                            os.path.join(work_dir, 'work'), converter=converter, incremental=False, streaming=streaming)
+    save_path = os.path.join(work_dir, 'streamed.pdf' if streaming else 'in_memory.pdf')
+    tracemalloc.start()
+    try:
+        builder.prepare_content(material_paths)
+        builder.build_packet('基准大学', save_path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        builder.cleanup()
+        converter.close()
+    return peak, os.path.getsize(save_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='检查流式合并的内存峰值是否低于上限')
+    parser.add_argument('sizes', nargs='*', type=int, help=f"总页数（默认 {' '.join(map(str, DEFAULT_SIZES))}）")
+    parser.add_argument('--ceiling', type=float, default=DEFAULT_CEILING_MB, help='内存峰值上限，单位 MB（默认 %(default)s）')
+    parser.add_argument('--compare', action='store_true', help='同时测量普通合并的内存峰值作对照')
+    args = parser.parse_args(argv)
+
+    failed = False
+    root = tempfile.mkdtemp(prefix='scmg-stream-')
+    try:
+        print(f"{'页数':>6} {'输入(MB)':>9} {'方式':<8} {'峰值(MB)':>9} {'输出(MB)':>9}")
+        for size in args.sizes or DEFAULT_SIZES:
+            material_paths = build_corpus(os.path.join(root, f"{size}p"), size)
+            input_mb = sum(os.path.getsize(path) for path in material_paths) / 1048576
+            modes = [True, False] if args.compare else [True]
+            for streaming in modes:
+                peak, output_size = measure(material_paths, os.path.join(root, f"{size}p"), streaming)
+                peak_mb = peak / 1048576
+                mark = ''
+                if streaming and peak_mb > args.ceiling:
+                    mark = f"  超过上限 {args.ceiling:g} MB"
+                    failed = True
+                print(f"{size:>6} {input_mb:>9.1f} {'流式' if streaming else '普通':<8} {peak_mb:>9.1f} "
+                      f"{output_size / 1048576:>9.1f}{mark}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+按输出大小上限生成：很多申请系统限制上传文件为 5~20 MB，超出时自动为每张图片降低分辨率和 JPEG 质量。
+
+第一遍按原有参数完整生成。超出上限时，把输出大小看作“图片以外的固定部分 + 各图片转换结果的大小”，
+每张图片沿 QUALITY_LEVELS 逐级降低（PNG 等无损格式不受 JPEG 质量影响，只降低分辨率），每一步都选当前节省字节最多的那张图片，直到估计大小不超过上限；
+每张图片只在被选到时才编码下一级，总的编码次数约为“图片数 + 降级步数”。
+各级的编码结果都进入转换缓存（未使用缓存时用一个临时缓存），最后一遍生成直接命中，
+因此达到上限通常只多一遍生成。估计有偏差、仍然超出时，按实际大小修正固定部分后继续降级。
+"""
+import os
+import uuid
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import ConversionCache
+from engine import conversion_settings
+from images import convert_image_to_pdf, is_jpeg
+
+# (目标 DPI, JPEG 质量)，从高到低；起点为生成器原有的参数，只使用不高于起点的级别
+QUALITY_LEVELS = [(200, 85), (150, 80), (150, 65), (120, 60), (100, 50), (80, 40), (72, 30)]
+# 估计不准时最多再生成几遍
+MAX_EXTRA_PASSES = 2
+TEMPORARY_CACHE_SIZE = 64 * 1024 * 1024 * 1024
+
+
+def quality_ladder(target_dpi, jpeg_quality, jpeg=True):
+    """
+    返回以 (target_dpi, jpeg_quality) 开头、逐级降低的参数列表；target_dpi 为 None 表示原始分辨率。
+    jpeg 为 False 时质量不起作用，只保留分辨率降低的级别，质量保持 jpeg_quality 不变。
+    """
+    ladder = [(target_dpi, jpeg_quality)]
+    for dpi, quality in QUALITY_LEVELS:
+        if not jpeg:
+            previous = ladder[-1][0]
+            if previous is None or dpi < previous:
+                ladder.append((dpi, jpeg_quality))
+        elif (target_dpi is None or dpi <= target_dpi) and quality <= jpeg_quality and (dpi, quality) != ladder[0]:
+            ladder.append((dpi, quality))
+    return ladder
+
+
+class BudgetReport:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # [(院校名称, 输出路径, 字节数)]，第一个是据以选择参数的那一份
+        self.outputs = []
+        self.passes = 0
+        self.encodings = 0
+        # [(文件名, 目标 DPI, JPEG 质量, 转换后字节数)]，非 JPEG 图片的质量为 None
+        self.choices = []
+        # 仍超过上限的原因：'exhausted' 图片都已降到最低一级，'passes' 达到 MAX_EXTRA_PASSES，'no_images' 没有图片可降
+        self.stopped = None
+
+    @property
+    def met(self):
+        return all(size <= self.max_bytes for _, _, size in self.outputs)
+
+    def summary(self):
+        lines = [f"大小上限 {self.max_bytes / 1048576:.2f} MB（共生成 {self.passes} 遍，编码图片 {self.encodings} 次）"]
+        for school_name, _, size in self.outputs:
+            state = '未超过' if size <= self.max_bytes else '超过上限'
+            lines.append(f"  {school_name}: {size / 1048576:.2f} MB，{state}")
+        for name, dpi, quality, size in self.choices:
+            resolution = f"{dpi} DPI" if dpi else '原始分辨率'
+            setting = f"{resolution}，JPEG 质量 {quality}" if quality is not None else resolution
+            lines.append(f"  {name}: {setting}，{size / 1024:.0f} KB")
+        if not self.met:
+            if self.stopped == 'passes':
+                lines.append(f"大小估计偏差较大，已额外生成 {self.passes - 1} 遍仍超过上限，图片尚未降到最低一级；"
+                             "可以把上限设得略低一些再试。")
+            elif self.stopped == 'no_images':
+                lines.append("材料中没有可以降低分辨率的图片，请减少材料或压缩 PDF 原件。")
+            else:
+                lines.append("图片降到最低一级仍超过上限，请减少材料或压缩 PDF 原件。")
+        return '\n'.join(lines)
+
+
+class _VariantSizes:
+    """按需编码图片的各级参数并记下转换结果的大小；结果存入缓存，最后一遍生成直接命中"""
+    def __init__(self, builder, cache, work_dir, report):
+        self.builder = builder
+        self.cache = cache
+        self.work_dir = work_dir
+        self.report = report
+        self.sizes = {}
+        self._lock = threading.Lock()
+
+    def size(self, path, level):
+        key = (path, level)
+        if key not in self.sizes:
+            dpi, quality = level
+            _, settings = conversion_settings(path, self.builder.converter.backend_name, dpi, quality)
+            target = os.path.join(self.work_dir, f"{uuid.uuid4().hex}.pdf")
+
+            def convert(source, dest):
+                with self._lock:
+                    self.report.encodings += 1
+                convert_image_to_pdf(source, dest, dpi, quality)
+
+            self.sizes[key] = os.path.getsize(self.cache.fetch_or_convert(path, settings, target, convert))
+        return self.sizes[key]
+
+
+def _build(builder, material_paths, school_name, save_path, report):
+    builder.prepare_content(material_paths)
+    builder.build_packet(school_name, save_path)
+    report.passes += 1
+    return os.path.getsize(save_path)
+
+
+def build_within_budget(builder, material_paths, jobs, max_bytes):
+    """
+    为 jobs（[(院校名称, 输出路径)]）生成不超过 max_bytes 的材料包，返回 BudgetReport。
+    参数按第一个院校选择，其余院校的内容只有封面上的院校名称不同，直接沿用。
+    降级后的文件需要完整重写，这里不做增量更新。
+    """
+    school_name, save_path = jobs[0]
+    report = BudgetReport(max_bytes)
+    builder.incremental = False
+    images = [path for path in material_paths
+              if conversion_settings(path, builder.converter.backend_name)[0] == 'image']
+    ladders = {path: quality_ladder(builder.target_dpi, builder.jpeg_quality, is_jpeg(path)) for path in images}
+    levels = {path: 0 for path in images}
+    builder.image_settings = {}
+
+    temporary_dir = None
+    if builder.cache is None:
+        temporary_dir = tempfile.mkdtemp(prefix='scmg-budget-')
+        builder.cache = ConversionCache(temporary_dir, TEMPORARY_CACHE_SIZE)
+    variant_dir = tempfile.mkdtemp(prefix='scmg-variants-')
+    try:
+        variants = _VariantSizes(builder, builder.cache, variant_dir, report)
+        size = _build(builder, material_paths, school_name, save_path, report)
+        rebuilds = 0
+        while size > max_bytes:
+            if not images:
+                report.stopped = 'no_images'
+                break
+            if all(levels[path] + 1 >= len(ladders[path]) for path in images):
+                report.stopped = 'exhausted'
+                break
+            # 第一遍降级之后，估计不准时最多再修正 MAX_EXTRA_PASSES 遍
+            if rebuilds > MAX_EXTRA_PASSES:
+                report.stopped = 'passes'
+                break
+            # 第一轮各图片的下一级可以并行编码
+            with ThreadPoolExecutor(max_workers=builder.workers) as executor:
+                for path in images:
+                    if levels[path] + 1 < len(ladders[path]):
+                        executor.submit(variants.size, path, ladders[path][levels[path] + 1])
+            fixed = size - sum(variants.size(path, ladders[path][levels[path]]) for path in images)
+            estimate = size
+            changed = False
+            while estimate > max_bytes:
+                builder._check_cancelled()
+                best = None
+                for path in images:
+                    current = variants.size(path, ladders[path][levels[path]])
+                    # 跳过不再变小的级别（例如原图分辨率已低于目标）
+                    for level in range(levels[path] + 1, len(ladders[path])):
+                        saving = current - variants.size(path, ladders[path][level])
+                        if saving > 0:
+                            if best is None or saving > best[0]:
+                                best = (saving, path, level)
+                            break
+                if best is None:
+                    break
+                _, path, level = best
+                levels[path] = level
+                changed = True
+                estimate = fixed + sum(variants.size(image, ladders[image][levels[image]]) for image in images)
+            if not changed:
+                report.stopped = 'exhausted'  # 所有图片都已降到最低
+                break
+            builder.image_settings = {path: ladders[path][levels[path]] for path in images}
+            rebuilds += 1
+            size = _build(builder, material_paths, school_name, save_path, report)
+        report.outputs.append((school_name, save_path, size))
+        for other_school, other_path in jobs[1:]:
+            builder.build_packet(other_school, other_path)
+            report.outputs.append((other_school, other_path, os.path.getsize(other_path)))
+        # 第一遍就满足上限时各图片的大小还没有测量过，这里从缓存中读取最后一遍生成用到的转换结果
+        for path in images:
+            dpi, quality = ladders[path][levels[path]]
+            size = variants.size(path, (dpi, quality))
+            report.choices.append((os.path.basename(path), dpi, quality if is_jpeg(path) else None, size))
+    finally:
+        if temporary_dir is not None:
+            builder.cache = None
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+        shutil.rmtree(variant_dir, ignore_errors=True)
+    return report
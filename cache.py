@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024  # 默认上限 1 GB
+
+
+def app_cache_dir():
+    """程序所有缓存的根目录，放在用户目录下，不随输出位置变化"""
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'SummerCampMaterialGenerator')
+
+
+def default_cache_dir():
+    return os.path.join(app_cache_dir(), 'conversions')
+
+
+def app_cache_path(name):
+    """
+    与转换缓存并列的其他缓存（缩略图、字体解析结果、元数据索引）的默认位置，清空转换缓存时不受影响。
+    旧版本把它们放在转换缓存目录中，第一次用到时移动过来，已有的缓存继续有效。
+    """
+    path = os.path.join(app_cache_dir(), name)
+    legacy_path = os.path.join(default_cache_dir(), name)
+    if not os.path.exists(path) and os.path.exists(legacy_path):
+        try:
+            os.replace(legacy_path, path)
+        except OSError:
+            pass
+    return path
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    转换结果的持久化缓存，按源文件内容哈希和转换参数寻址。
+    源文件的路径、大小和修改时间未变时直接复用记录的哈希，避免每次重新读取大文件；
+    总大小超过上限时按最近最少使用（LRU）顺序淘汰。
+    """
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pinned = set()  # 本次运行中已使用的条目，不参与淘汰
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._entries, self._fingerprints = self._load_index()
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, self.INDEX_NAME)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get('entries', {}), data.get('fingerprints', {})
+        except (OSError, ValueError):
+            return {}, {}
+
+    def save(self):
+        """把索引原子地写回磁盘"""
+        with self._lock:
+            data = {'entries': self._entries, 'fingerprints': self._fingerprints}
+            tmp_path = self._index_path() + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._index_path())
+
+    def content_hash(self, source_path):
+        """返回源文件的内容哈希；大小和修改时间未变时复用上次的结果"""
+        source_path = os.path.abspath(source_path)
+        stat = os.stat(source_path)
+        with self._lock:
+            known = self._fingerprints.get(source_path)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['hash']
+        digest = hash_file(source_path)
+        with self._lock:
+            self._fingerprints[source_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest}
+        return digest
+
+    def make_key(self, source_path, settings):
+        settings_text = json.dumps(settings, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(f"{self.content_hash(source_path)}|{settings_text}".encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pdf")
+
+    def get(self, source_path, settings):
+        """命中时返回缓存中 PDF 的路径，否则返回 None"""
+        key = self.make_key(source_path, settings)
+        path = self._entry_path(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and os.path.exists(path) and os.path.getsize(path) == entry['size']:
+                entry['last_used'] = time.time()
+                self._pinned.add(key)
+                self.hits += 1
+                return path
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def peek(self, source_path, settings):
+        """只查询，不计入命中统计也不固定条目（供界面显示缩略图等使用）；命中时返回缓存中 PDF 的路径"""
+        key = self.make_key(source_path, settings)
+        path = self._entry_path(key)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and os.path.exists(path) and os.path.getsize(path) == entry['size']:
+            return path
+        return None
+
+    def put(self, source_path, settings, pdf_path):
+        """把刚转换好的 PDF 存入缓存，返回缓存中的路径"""
+        key = self.make_key(source_path, settings)
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        shutil.copyfile(pdf_path, tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._entries[key] = {'size': os.path.getsize(path), 'last_used': time.time()}
+            self._pinned.add(key)
+            self._evict()
+        return path
+
+    def fetch_or_convert(self, source_path, settings, dest_path, convert):
+        """
+        缓存命中时直接返回缓存文件路径；
+        未命中时调用 convert(source_path, dest_path) 转换后存入缓存。
+        """
+        cached_path = self.get(source_path, settings)
+        if cached_path:
+            return cached_path
+        convert(source_path, dest_path)
+        self.put(source_path, settings, dest_path)
+        return dest_path
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry['size'] for entry in self._entries.values())
+
+    def _evict(self):
+        total = sum(entry['size'] for entry in self._entries.values())
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if key in self._pinned:
+                continue
+            total -= self._entries.pop(key)['size']
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+
+    def stats_text(self):
+        return f"缓存命中 {self.hits} 次，未命中 {self.misses} 次，占用 {self.total_bytes() / 1024 / 1024:.1f} MB"
@@ -0,0 +1,369 @@
+"""
+Word 文档转换后端。
+
+每个后端实例代表一个长期存活的转换会话（例如一个 Word 进程），
+会话由 ConverterPool 统一管理：重复使用、健康检查、超时后强制结束并替换。
+"""
+import os
+import sys
+import time
+import uuid
+import queue
+import shutil
+import atexit
+import pathlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+DEFAULT_TIMEOUT = 180          # 单个文件转换的超时时间（秒）
+HEALTH_CHECK_TIMEOUT = 15      # 健康检查的超时时间（秒）
+DEFAULT_MAX_USES = 200         # 会话转换多少个文件后主动回收，防止资源泄漏
+
+
+class ConverterBackend:
+    """转换后端的基类。除 kill 外，所有方法都只会在所属会话的专用线程中调用。"""
+    name = 'base'
+
+    def open(self):
+        """启动会话，例如启动 Word 进程"""
+
+    def convert(self, source_path, pdf_path):
+        raise NotImplementedError
+
+    def ping(self):
+        """健康检查，会话可用时返回 True"""
+        return True
+
+    def close(self):
+        """正常关闭会话"""
+
+    def kill(self):
+        """从其他线程强制结束卡死的会话"""
+
+
+class ComWordBackend(ConverterBackend):
+    """通过 COM 驱动 Microsoft Word，一个会话对应一个独立的 Word 进程（仅限 Windows）"""
+    name = 'com'
+
+    def __init__(self):
+        self.word = None
+        self.pid = None
+
+    def open(self):
+        import pythoncom
+        import win32com.client
+        pythoncom.CoInitialize()
+        self.word = win32com.client.DispatchEx("Word.Application")
+        self.word.Visible = False
+        self.word.DisplayAlerts = 0
+        self.pid = self._find_pid()
+
+    def _find_pid(self):
+        """通过唯一的窗口标题找到 Word 进程号，用于在卡死时强制结束"""
+        try:
+            import win32gui
+            import win32process
+            caption = f"scmg-{uuid.uuid4().hex}"
+            self.word.Caption = caption
+            hwnd = win32gui.FindWindow(None, caption)
+            return win32process.GetWindowThreadProcessId(hwnd)[1] if hwnd else None
+        except Exception:
+            return None
+
+    def convert(self, source_path, pdf_path):
+        doc = self.word.Documents.Open(os.path.abspath(source_path), ReadOnly=True)
+        try:
+            doc.SaveAs(os.path.abspath(pdf_path), FileFormat=17)
+        finally:
+            doc.Close(False)
+
+    def ping(self):
+        self.word.Documents.Count
+        return True
+
+    def close(self):
+        try:
+            if self.word: self.word.Quit()
+        finally:
+            self.word = None
+            import pythoncom
+            pythoncom.CoUninitialize()
+
+    def kill(self):
+        if self.pid:
+            try:
+                os.kill(self.pid, 9)
+            except OSError:
+                pass
+
+
+def find_soffice():
+    for name in ('soffice', 'libreoffice'):
+        path = shutil.which(name)
+        if path:
+            return path
+    if sys.platform == 'win32':
+        path = os.path.join(os.environ.get('PROGRAMFILES', r'C:\Program Files'), 'LibreOffice', 'program', 'soffice.exe')
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class LibreOfficeBackend(ConverterBackend):
+    """
+    使用无界面的 LibreOffice（soffice --convert-to pdf）转换，可在 Linux 上运行。
+    每个会话使用独立且持续复用的用户配置目录：既避免每次转换都重新初始化配置，
+    也让多个会话可以同时运行。
+    """
+    name = 'libreoffice'
+
+    def __init__(self, soffice_path=None):
+        self.soffice_path = soffice_path or find_soffice()
+        self.profile_dir = None
+        self._process = None
+
+    def open(self):
+        if not self.soffice_path:
+            raise Exception("未找到 LibreOffice (soffice)，无法转换Word文档。")
+        self.profile_dir = tempfile.mkdtemp(prefix='scmg_soffice_')
+
+    def convert(self, source_path, pdf_path):
+        out_dir = tempfile.mkdtemp(dir=self.profile_dir)
+        try:
+            cmd = [self.soffice_path,
+                   f"-env:UserInstallation={pathlib.Path(self.profile_dir, 'profile').as_uri()}",
+                   '--headless', '--norestore', '--nologo',
+                   '--convert-to', 'pdf', '--outdir', out_dir, os.path.abspath(source_path)]
+            self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            _, stderr = self._process.communicate()
+            produced = os.path.join(out_dir, os.path.splitext(os.path.basename(source_path))[0] + '.pdf')
+            if self._process.returncode != 0 or not os.path.exists(produced):
+                raise Exception(stderr.decode(errors='replace').strip() or f"soffice 退出码 {self._process.returncode}")
+            shutil.move(produced, pdf_path)
+        finally:
+            self._process = None
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    def ping(self):
+        return bool(self.soffice_path) and os.path.exists(self.soffice_path)
+
+    def close(self):
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def kill(self):
+        process = self._process
+        if process and process.poll() is None:
+            process.kill()
+
+
+class FakeBackend(ConverterBackend):
+    """进程内的假后端，用 reportlab 生成占位 PDF，供测试和基准使用"""
+    name = 'fake'
+
+    def __init__(self, pages=1, delay=0.0):
+        self.pages = pages
+        self.delay = delay
+
+    def _lines(self, source_path):
+        try:
+            from docx import Document
+            return [p.text for p in Document(source_path).paragraphs if p.text.strip()]
+        except Exception:
+            return [os.path.basename(source_path)]
+
+    def convert(self, source_path, pdf_path):
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A4
+        if self.delay:
+            time.sleep(self.delay)
+        lines = self._lines(source_path)
+        c = canvas.Canvas(pdf_path, pagesize=A4)
+        for _ in range(self.pages):
+            y = A4[1] - 72
+            for line in lines:
+                for text in line.split('\n'):
+                    c.drawString(72, y, text)
+                    y -= 14
+            c.showPage()
+        c.save()
+
+
+BACKENDS = {
+    ComWordBackend.name: ComWordBackend,
+    LibreOfficeBackend.name: LibreOfficeBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+
+def default_backend_name():
+    """可通过环境变量 SCMG_CONVERTER 指定；否则 Windows 上优先使用 Word，其他平台使用 LibreOffice"""
+    name = os.environ.get('SCMG_CONVERTER')
+    if name:
+        return name
+    if sys.platform == 'win32':
+        try:
+            import win32com.client  # noqa: F401
+            return ComWordBackend.name
+        except ImportError:
+            pass
+    return LibreOfficeBackend.name
+
+
+class ConverterSession:
+    """一个后端实例加上一个专用线程；COM 对象必须始终在创建它的线程中使用"""
+    def __init__(self, backend):
+        self.backend = backend
+        self.uses = 0
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"converter-{backend.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            func, args, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+        try:
+            self.backend.close()
+        except Exception:
+            pass
+
+    def call(self, func, *args):
+        future = Future()
+        self._jobs.put((func, args, future))
+        return future
+
+    def stop(self):
+        self._jobs.put(None)
+
+
+class ConverterPool:
+    """
+    可复用的转换会话池。会话按需启动并在多次转换之间保持存活；
+    取出会话前先做健康检查，转换超时的会话会被强制结束并由新会话替换。
+    """
+    def __init__(self, backend_factory, size=1, timeout=DEFAULT_TIMEOUT, max_uses=DEFAULT_MAX_USES):
+        self.backend_factory = backend_factory
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.backend_name = getattr(backend_factory, 'name', None) or backend_factory().name
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._count = 0
+        self._closed = False
+
+    def _start_session(self):
+        session = ConverterSession(self.backend_factory())
+        try:
+            session.call(session.backend.open).result(timeout=self.timeout)
+        except Exception:
+            self._discard(session)
+            raise
+        return session
+
+    def _discard(self, session, kill=False):
+        if kill:
+            session.backend.kill()
+        session.stop()
+        with self._lock:
+            self._count -= 1
+
+    def _healthy(self, session):
+        if session.uses >= self.max_uses:
+            return False
+        try:
+            return bool(session.call(session.backend.ping).result(timeout=HEALTH_CHECK_TIMEOUT))
+        except Exception:
+            return False
+
+    def _acquire(self):
+        while True:
+            if self._closed:
+                raise Exception("转换会话池已关闭。")
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_start = self._count < self.size
+                    if can_start:
+                        self._count += 1
+                if can_start:
+                    return self._start_session()
+                try:
+                    session = self._idle.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            if self._healthy(session):
+                return session
+            self._discard(session, kill=True)
+
+    def convert(self, source_path, pdf_path):
+        try:
+            session = self._acquire()
+        except Exception as e:
+            raise Exception(f"转换Word失败 {os.path.basename(source_path)}: 无法启动转换程序: {e}")
+        future = session.call(session.backend.convert, source_path, pdf_path)
+        try:
+            future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self._discard(session, kill=True)
+            raise Exception(f"转换Word失败 {os.path.basename(source_path)}: 超过 {self.timeout} 秒未完成，已强制结束转换程序。")
+        except Exception as e:
+            self._idle.put(session)
+            raise Exception(f"转换Word失败 {os.path.basename(source_path)}: {e}")
+        session.uses += 1
+        self._idle.put(session)
+        return True
+
+    def ensure_size(self, size):
+        """并行转换时按需扩大会话数量上限"""
+        with self._lock:
+            self.size = max(self.size, size)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(session)
+
+
+def create_pool(backend_name=None, size=1, **kwargs):
+    backend_name = backend_name or default_backend_name()
+    if backend_name not in BACKENDS:
+        raise Exception(f"未知的转换后端: {backend_name}（可选: {', '.join(BACKENDS)}）")
+    return ConverterPool(BACKENDS[backend_name], size=size, **kwargs)
+
+
+_shared_pools = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_pool(backend_name=None):
+    """返回当前进程内共享的会话池，进程退出时自动关闭"""
+    backend_name = backend_name or default_backend_name()
+    with _shared_lock:
+        pool = _shared_pools.get(backend_name)
+        if pool is None:
+            pool = _shared_pools[backend_name] = create_pool(backend_name)
+        return pool
+
+
+@atexit.register
+def _close_shared_pools():
+    for pool in _shared_pools.values():
+        pool.close()
@@ -0,0 +1,303 @@
+"""
+封面与目录的渲染。
+
+surface.docx 只转换一次（结果进入转换缓存），其中的占位符被替换成白色的定位标记。
+转换后记下各标记的位置并从内容流中删除标记文字，缓存中的模板和生成的材料包里都不留下可选中、可搜索的标记；
+标记位置保存在模板 PDF 的文档信息中。之后每所院校只需在模板页上用 reportlab 直接画出院校名称和目录，不再为每次生成启动 Word。
+目录采用两遍排版：先算出目录一共需要几页，再据此计算各材料的准确起始页码。
+"""
+import os
+import io
+import json
+import math
+
+from docx import Document
+from docx.shared import Pt, RGBColor
+from pypdf import PdfReader, PdfWriter, PageObject
+from pypdf.generic import ArrayObject, ContentStream, DictionaryObject, NameObject, StreamObject
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from reportlab.lib.units import inch
+
+from manifest import source_fingerprint
+from stamping import add_stream, wrap_contents
+from fonts import register_fonts
+from images import binary_streams
+
+SCHOOL_PLACEHOLDER = '【目标院校名称】'
+TOC_PLACEHOLDER = '【目录】'
+
+SCHOOL_MARKER = 'SCMGSCHOOLMARK'
+TOC_MARKER = 'SCMGTOCMARK'
+
+# 参与转换缓存键的计算，修改标记方式时请提升 version
+COVER_TEMPLATE_SETTINGS = {'converter': 'cover-template', 'version': 2}
+# 模板 PDF 文档信息中保存标记位置的键
+MARKER_POSITIONS_KEY = '/SCMGMarkerPositions'
+# 显示文字的操作符；' 和 " 同时换行，删除时保留换行和间距设置
+TEXT_SHOW_OPERATORS = (b'Tj', b'TJ', b"'", b'"')
+
+SCHOOL_FONT = 'SimHei'
+SCHOOL_FONT_SIZE = 26
+TOC_FONT = 'SimSun'
+TOC_FONT_SIZE = 12
+TOC_LEADING = 18
+FALLBACK_CJK_FONT = 'STSong-Light'
+OVERLAY_XOBJECT_NAME = '/SCMGOverlay'
+
+
+def cjk_font(preferred):
+    """优先使用已注册的 Windows 字体，否则退回 reportlab 内置的中文 CID 字体"""
+    register_fonts()
+    if preferred in pdfmetrics.getRegisteredFontNames():
+        return preferred
+    if FALLBACK_CJK_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(UnicodeCIDFont(FALLBACK_CJK_FONT))
+    return FALLBACK_CJK_FONT
+
+
+def _replace_with_marker(doc, placeholder, marker, font_name, font_size):
+    for p in doc.paragraphs:
+        if placeholder in p.text:
+            p.text = ""
+            run = p.add_run(marker)
+            run.font.name = font_name
+            run.font.size = Pt(font_size)
+            run.font.color.rgb = RGBColor(0xFF, 0xFF, 0xFF)
+            return True
+    return False
+
+
+def _locate_markers(reader):
+    """在转换好的模板中找到各标记的位置，返回 {标记: (页序号, x, y)}"""
+    found = {}
+    for index, page in enumerate(reader.pages):
+        def visitor(text, cm, tm, font_dict, font_size, index=index):
+            for marker in (SCHOOL_MARKER, TOC_MARKER):
+                if marker in text and marker not in found:
+                    x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+                    y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+                    found[marker] = (index, x, y)
+        page.extract_text(visitor_text=visitor)
+    return found
+
+
+def _operation_text(page, font, operands, operator):
+    """单独提取一个显示文字操作的文字：在只含这一操作的空白页上用页面原有的字体资源提取"""
+    probe = PageObject.create_blank_page(width=1, height=1)
+    probe[NameObject('/Resources')] = page['/Resources']
+    content = ContentStream(None, None)
+    content.operations = [([], b'BT')] + ([(font, b'Tf')] if font else []) + [(operands, operator), ([], b'ET')]
+    probe.replace_contents(content)
+    return probe.extract_text()
+
+
+def _strip_marker_operations(page, markers):
+    """删除页面中组成标记的显示文字操作，返回是否有改动"""
+    content = ContentStream(page.get_contents(), page.pdf)
+    pieces, font = [], None
+    for position, (operands, operator) in enumerate(content.operations):
+        if operator == b'Tf':
+            font = operands
+        elif operator in TEXT_SHOW_OPERATORS:
+            pieces.append((position, _operation_text(page, font, operands, operator)))
+
+    # 标记可能被拆成几个操作，按拼接后的文字找出完全落在标记之内的操作
+    joined = ''.join(text for _, text in pieces)
+    remove, offset = set(), 0
+    spans = [(start, start + len(marker)) for marker in markers
+             for start in [joined.find(marker)] if start >= 0]
+    for position, text in pieces:
+        end = offset + len(text)
+        if text.strip() and any(start <= offset and end <= stop for start, stop in spans):
+            remove.add(position)
+        offset = end
+    if not remove:
+        return False
+
+    operations = []
+    for position, (operands, operator) in enumerate(content.operations):
+        if position not in remove:
+            operations.append((operands, operator))
+        elif operator == b"'":
+            operations.append(([], b'T*'))
+        elif operator == b'"':
+            operations.extend([([operands[0]], b'Tw'), ([operands[1]], b'Tc'), ([], b'T*')])
+    content.operations = operations
+    page.replace_contents(content)
+    return True
+
+
+def strip_markers(pdf_path, output_path):
+    """
+    找到转换好的模板中各标记的位置，写出删除了标记文字的模板到 output_path，标记位置记入文档信息。
+    """
+    reader = PdfReader(pdf_path)
+    found = _locate_markers(reader)
+    writer = PdfWriter(clone_from=reader)
+    for index in {index for index, _, _ in found.values()}:
+        _strip_marker_operations(writer.pages[index], list(found))
+    writer.add_metadata({MARKER_POSITIONS_KEY: json.dumps(found)})
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+
+
+def _marker_positions(reader):
+    """读取 strip_markers 记下的标记位置；没有记录时在页面中查找标记"""
+    positions = (reader.metadata or {}).get(MARKER_POSITIONS_KEY)
+    if positions is None:
+        return _locate_markers(reader)
+    return {marker: tuple(position) for marker, position in json.loads(positions).items()}
+
+
+def merge_overlay(writer, page, overlay):
+    """
+    把覆盖层页面作为表单 XObject 叠加到页面上。
+    与 merge_page 不同，两者的内容流都不需要解析、重命名资源和重新序列化。
+    """
+    contents = overlay.get('/Contents')
+    if contents is None or not isinstance(contents.get_object(), StreamObject):
+        page.merge_page(overlay)
+        return
+    form = contents.get_object().clone(writer)
+    form[NameObject('/Type')] = NameObject('/XObject')
+    form[NameObject('/Subtype')] = NameObject('/Form')
+    form[NameObject('/BBox')] = ArrayObject(overlay.mediabox)
+    form[NameObject('/Resources')] = overlay['/Resources'].clone(writer)
+
+    # 模板页面之间可能共用资源字典，复制一份再加入表单，避免影响其他页面
+    resources = page.get('/Resources')
+    resources = DictionaryObject(resources.get_object()) if resources is not None else DictionaryObject()
+    xobjects = resources.get('/XObject')
+    xobjects = DictionaryObject(xobjects.get_object()) if xobjects is not None else DictionaryObject()
+    xobjects[NameObject(OVERLAY_XOBJECT_NAME)] = form.indirect_reference
+    resources[NameObject('/XObject')] = xobjects
+    page[NameObject('/Resources')] = resources
+
+    wrap_contents(writer, page, [add_stream(writer, b"q\n")],
+                  [add_stream(writer, f"Q q {OVERLAY_XOBJECT_NAME} Do Q\n".encode('ascii'))])
+
+
+def prepare_cover_template(template_path, converter, work_dir, cache=None):
+    """把模板转换为带定位标记的 PDF（命中缓存时跳过转换），返回 CoverTemplate"""
+    doc = Document(template_path)
+    _replace_with_marker(doc, SCHOOL_PLACEHOLDER, SCHOOL_MARKER, '黑体', SCHOOL_FONT_SIZE)
+    _replace_with_marker(doc, TOC_PLACEHOLDER, TOC_MARKER, '宋体', TOC_FONT_SIZE)
+    section = doc.sections[0]
+    margins = tuple(float(length.pt) if length is not None else inch
+                    for length in (section.left_margin, section.right_margin, section.top_margin, section.bottom_margin))
+
+    settings = dict(COVER_TEMPLATE_SETTINGS, backend=converter.backend_name)
+    pdf_path = cache.get(template_path, settings) if cache is not None else None
+    if pdf_path is None:
+        docx_path = os.path.join(work_dir, "cover_template.docx")
+        pdf_path = os.path.join(work_dir, "cover_template.pdf")
+        marked_path = os.path.join(work_dir, "cover_template_marked.pdf")
+        doc.save(docx_path)
+        converter.convert(docx_path, marked_path)
+        strip_markers(marked_path, pdf_path)
+        if cache is not None:
+            pdf_path = cache.put(template_path, settings, pdf_path)
+    return CoverTemplate(pdf_path, margins, source_fingerprint(template_path, settings))
+
+
+class CoverTemplate:
+    """
+    转换好的封面模板及其排版信息。只保存路径和数字，可以直接传给子进程。
+    fingerprint 标识模板文件本身，用于判断上次生成的封面能否沿用同一套排版。
+    """
+    def __init__(self, pdf_path, margins, fingerprint=None):
+        self.pdf_path = pdf_path
+        self.fingerprint = fingerprint
+        self.left_margin, self.right_margin, self.top_margin, self.bottom_margin = margins
+        reader = PdfReader(pdf_path)
+        self.page_sizes = [(float(page.mediabox.width), float(page.mediabox.height)) for page in reader.pages]
+        markers = _marker_positions(reader)
+        width, height = self.page_sizes[0]
+        # 找不到标记（例如转换程序丢弃了白色文字）时使用与模板大致相同的默认位置
+        self.school_position = markers.get(SCHOOL_MARKER, (0, width / 2, height * 0.55))
+        self.toc_position = markers.get(TOC_MARKER, (0, self.left_margin, height * 0.45))
+
+    @property
+    def template_page_count(self):
+        return len(self.page_sizes)
+
+    def _toc_page_size(self):
+        return self.page_sizes[self.toc_position[0]]
+
+    def capacity(self):
+        """返回 (模板目录页能容纳的行数, 每个续页能容纳的行数)"""
+        _, height = self._toc_page_size()
+        first = max(0, int((self.toc_position[2] - self.bottom_margin) // TOC_LEADING) + 1)
+        extra = max(1, int((height - self.top_margin - self.bottom_margin - TOC_FONT_SIZE) // TOC_LEADING) + 1)
+        return first, extra
+
+    def page_count(self, entry_count):
+        """第一遍排版：计算封面加目录一共需要的页数"""
+        first, extra = self.capacity()
+        return self.template_page_count + math.ceil(max(0, entry_count - first) / extra)
+
+    def toc_entries(self, segments):
+        """第二遍排版：根据目录实际页数计算每个材料的起始页码"""
+        offset = self.page_count(len(segments))
+        return [{'title': segment['title'], 'page': segment['start'] + offset} for segment in segments]
+
+    def _draw_toc_lines(self, c, entries, x_left, x_right, y, font):
+        c.setFont(font, TOC_FONT_SIZE)
+        dot_width = pdfmetrics.stringWidth('.', font, TOC_FONT_SIZE)
+        for entry in entries:
+            number = str(entry['page'])
+            number_width = pdfmetrics.stringWidth(number, font, TOC_FONT_SIZE)
+            title = self._fit(entry['title'], x_right - x_left - number_width - 4 * dot_width, font)
+            title_width = pdfmetrics.stringWidth(title, font, TOC_FONT_SIZE)
+            c.drawString(x_left, y, title)
+            c.drawRightString(x_right, y, number)
+            leader_width = x_right - number_width - x_left - title_width - 2 * dot_width
+            if leader_width > dot_width:
+                c.drawRightString(x_right - number_width - dot_width, y, '.' * int(leader_width // dot_width))
+            y -= TOC_LEADING
+
+    def _fit(self, text, max_width, font):
+        """标题过长时截断并加省略号，保证每个条目只占一行，行数计算才准确"""
+        if pdfmetrics.stringWidth(text, font, TOC_FONT_SIZE) <= max_width:
+            return text
+        while text and pdfmetrics.stringWidth(text + '…', font, TOC_FONT_SIZE) > max_width:
+            text = text[:-1]
+        return text + '…'
+
+    def _overlay(self, page_size, school_name=None, entries=(), toc_x=None, toc_y=None):
+        width, height = page_size
+        packet = io.BytesIO()
+        with binary_streams():
+            c = canvas.Canvas(packet, pagesize=page_size)
+            if school_name is not None:
+                c.setFont(cjk_font(SCHOOL_FONT), SCHOOL_FONT_SIZE)
+                center = (self.left_margin + width - self.right_margin) / 2
+                c.drawCentredString(center, self.school_position[2], school_name)
+            if entries:
+                self._draw_toc_lines(c, entries, toc_x, width - self.right_margin, toc_y, cjk_font(TOC_FONT))
+            c.save()
+        packet.seek(0)
+        return PdfReader(packet).pages[0]
+
+    def render(self, writer, school_name, toc_entries):
+        """把封面和目录页追加到写入器中，目录超出模板页时自动续页"""
+        first, extra = self.capacity()
+        chunks = [toc_entries[:first]] + [toc_entries[i:i + extra] for i in range(first, len(toc_entries), extra)]
+        toc_index, toc_x, toc_y = self.toc_position
+        school_index = self.school_position[0]
+
+        reader = PdfReader(self.pdf_path)
+        for index, page in enumerate(reader.pages):
+            added = writer.add_page(page)
+            school = school_name if index == school_index else None
+            entries = chunks[0] if index == toc_index else ()
+            if school is not None or entries:
+                merge_overlay(writer, added, self._overlay(self.page_sizes[index], school, entries, toc_x, toc_y))
+            if index == toc_index:
+                width, height = self.page_sizes[index]
+                for chunk in chunks[1:]:
+                    blank = writer.add_blank_page(width, height)
+                    merge_overlay(writer, blank, self._overlay((width, height), None, chunk, self.left_margin,
+                                                           height - self.top_margin - TOC_FONT_SIZE))
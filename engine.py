@@ -0,0 +1,752 @@
+import os
+import pickle
+import shutil
+import threading
+import functools
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# --- 导入所有处理库 ---
+from pypdf import PdfWriter, PdfReader
+
+from converters import get_shared_pool
+from formats import SUPPORTED_EXTENSIONS, IMAGE_EXTENSIONS, WORD_EXTENSIONS
+from stamping import PageNumberStamper
+from images import convert_image_to_pdf, DEFAULT_TARGET_DPI, DEFAULT_JPEG_QUALITY
+from cover import prepare_cover_template
+from incremental import IncrementalUpdate
+from streaming import StreamingPdfWriter, serialize_chunk, release_writer
+from optimize import optimize_and_write
+from metadata import pdf_metadata
+from profiling import NULL_PROFILE, timed_call, file_size
+from manifest import (source_fingerprint, load_manifest, save_manifest, remove_manifest,
+                      plan_incremental, is_up_to_date)
+
+EXECUTOR_KINDS = ['thread', 'process']
+
+# 进度权重：以“处理一页PDF”为 1 个单位，按字节数和页数估算各阶段的实际工作量
+WORD_CONVERSION_COST = 20
+COVER_RENDER_COST = 2
+WORD_BYTES_PER_UNIT = 50 * 1024
+IMAGE_BYTES_PER_UNIT = 200 * 1024
+PDF_BYTES_PER_UNIT = 1024 * 1024
+ESTIMATED_PAGES_PER_ITEM = 2
+
+# 流式合并时每块的页数；材料转换后的总大小超过 STREAMING_AUTO_BYTES 时自动改用流式合并
+STREAM_CHUNK_PAGES = 50
+STREAMING_AUTO_BYTES = 256 * 1024 * 1024
+
+# 转换参数会参与缓存键的计算，修改转换逻辑时请同时提升 version
+IMAGE_CONVERTER_SETTINGS = {'converter': 'image', 'version': 2, 'page_size': 'A4', 'margin_inch': 1}
+WORD_CONVERTER_SETTINGS = {'converter': 'word', 'version': 1, 'file_format': 17}
+
+
+def conversion_settings(path, backend_name, target_dpi=DEFAULT_TARGET_DPI, jpeg_quality=DEFAULT_JPEG_QUALITY):
+    """按扩展名确定材料的转换方式，返回 (类型, 转换参数)；不支持的格式返回 (None, None)"""
+    file_ext = os.path.splitext(path)[1].lower()
+    if file_ext == '.pdf':
+        return 'pdf', None
+    if file_ext in IMAGE_EXTENSIONS:
+        return 'image', dict(IMAGE_CONVERTER_SETTINGS, target_dpi=target_dpi, jpeg_quality=jpeg_quality)
+    if file_ext in WORD_EXTENSIONS:
+        return 'word', dict(WORD_CONVERTER_SETTINGS, backend=backend_name)
+    return None, None
+
+
+def material_metadata(path, metadata, backend_name, target_dpi=DEFAULT_TARGET_DPI, jpeg_quality=DEFAULT_JPEG_QUALITY):
+    """
+    不做任何转换，尽量给出材料转换后的元数据：PDF 直接读取（结果记入索引），图片固定为一页纵向，
+    Word 文档只能从索引中查到上次转换的结果，查不到时返回 None。
+    """
+    kind, settings = conversion_settings(path, backend_name, target_dpi, jpeg_quality)
+    if kind == 'image':
+        return {'pages': 1, 'landscape': [], 'size': None}
+    fingerprint = source_fingerprint(path, settings)
+    if kind == 'pdf':
+        return metadata.read(fingerprint, path)[0]
+    if kind == 'word':
+        return metadata.get(fingerprint)
+    return None
+
+
+class BuildCancelled(Exception):
+    """用户取消了生成"""
+
+
+@contextmanager
+def reading_material(path):
+    """把读取、合并材料时的异常统一报告为文件可能已损坏；取消不受影响"""
+    try:
+        yield
+    except BuildCancelled:
+        raise
+    except Exception as file_error:
+        raise Exception(f"处理文件 '{os.path.basename(path)}' 时发生错误，文件可能已损坏。") from file_error
+
+
+def add_page_numbers(writer, on_page=None):
+    """
+    为写入器中的每一页在底部居中添加页码；on_page 在每页处理完后调用，可用于报告进度或中途取消。
+    返回按页序排列的页码内容流引用。
+    """
+    return PageNumberStamper(writer).stamp_all(on_page)
+
+
+def add_material_page(writer, page, index, landscape=None):
+    """
+    把材料的第 index 页追加到写入器中，横向页面旋转为纵向阅读方向。
+    landscape 为元数据索引中的横向页序号集合，为 None 时逐页比较宽高。
+    """
+    added = writer.add_page(page)
+    if landscape is not None:
+        rotate = index in landscape
+    else:
+        rotate = added.mediabox.width > added.mediabox.height
+    if rotate:
+        added.rotate(90)
+    return added
+
+
+def append_segments(writer, segments, readers=None, on_page=None):
+    """
+    把各材料的页面直接从原文件追加到写入器中。
+    readers 可传入已打开的 {路径: PdfReader}，避免重复解析。
+    """
+    readers = readers or {}
+    for segment in segments:
+        with reading_material(segment['path']):
+            reader = readers.get(segment['path']) or PdfReader(segment['path'])
+            landscape = set(segment['landscape']) if 'landscape' in segment else None
+            for index, page in enumerate(reader.pages):
+                add_material_page(writer, page, index, landscape)
+                if on_page:
+                    on_page()
+
+
+def stream_material_pages(writer, path, landscape=None, on_added=None):
+    """
+    从文件按需读取材料 path 的全部页面追加到写入器中，处理完即关闭文件。
+    on_added(writer, reader) 在每页追加后调用并返回之后使用的写入器，流式合并借此在一块写满后换用下一块。
+    返回最后使用的写入器。
+    """
+    with reading_material(path), open(path, 'rb') as f:
+        reader = PdfReader(f)
+        landscape = set(landscape) if landscape is not None else None
+        # 先取出页面列表：清空解析缓存后再通过 reader.pages 计数会重新解析页面树
+        pages = list(reader.pages)
+        for index, page in enumerate(pages):
+            add_material_page(writer, page, index, landscape)
+            if on_added:
+                writer = on_added(writer, reader)
+    return writer
+
+
+class SharedContent:
+    """
+    所有院校共用、已添加页码并序列化的内容页（见 build_shared_content）。
+    只记录文件路径和页码，可以直接传给生成材料包的子进程。
+    """
+    def __init__(self, path, first_number, page_count):
+        self.path = path
+        self.first_number = first_number
+        self.page_count = page_count
+
+    def chunks(self):
+        """按顺序逐块读出 streaming.SerializedChunk，同一时间只有一块在内存中"""
+        with open(self.path, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+
+def build_shared_content(segments, path, first_number, readers=None, chunk_pages=None, on_page=None):
+    """
+    合并各材料的页面，从 first_number 起添加页码，序列化后写入 path，返回 SharedContent。
+    封面目录的页数只取决于材料个数，与院校名称无关，内容页的页码对所有院校都相同，因此只需处理一次。
+    chunk_pages 为 None 时全部页面放进同一个写入器（同一材料共用的字体、图片只写一份），可传入已打开的 readers；
+    否则每 chunk_pages 页一块，各材料直接从文件按需读取，内存有界（见 streaming 模块）。
+    on_page() 在每页合并和每页添加页码后各调用一次。
+    """
+    first_id = len(PdfWriter()._objects) + 1
+    page_count = 0
+
+    with open(path, 'wb') as f:
+        def flush(writer):
+            nonlocal page_count
+            number_refs = PageNumberStamper(writer).stamp_all(on_page, first_number + page_count)
+            page_count += len(number_refs)
+            chunk = serialize_chunk(writer, first_id, [ref.idnum for ref in number_refs])
+            pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+            release_writer(writer)
+
+        def on_added(writer, reader):
+            if on_page:
+                on_page()
+            if len(writer.pages) < chunk_pages:
+                return writer
+            flush(writer)
+            reader.resolved_objects.clear()
+            return PdfWriter()
+
+        writer = PdfWriter()
+        if chunk_pages is None:
+            append_segments(writer, segments, readers, on_page)
+        else:
+            for segment in segments:
+                writer = stream_material_pages(writer, segment['path'], segment.get('landscape'), on_added=on_added)
+        if len(writer.pages):
+            flush(writer)
+    return SharedContent(path, first_number, page_count)
+
+
+def write_packet(cover, segments, content, school_name, save_path, on_page=None, profile=NULL_PROFILE):
+    """
+    渲染院校的封面目录并添加页码，后面接上共用的内容页：内容页只平移对象编号后原样写出，不再解析、合并或添加页码。
+    先写入临时文件，成功后才替换 save_path。on_page() 在封面目录每页添加页码后和内容页每页写出后各调用一次。
+    返回按页序排列的页码内容流对象编号。
+    """
+    output = StreamingPdfWriter(save_path + '.tmp')
+    try:
+        with profile.stage('toc', school=school_name) as span:
+            writer = output.new_chunk()
+            cover.render(writer, school_name, cover.toc_entries(segments))
+            span.pages = len(writer.pages)
+            if span.pages + 1 != content.first_number:
+                raise Exception("封面目录的页数与共用内容页的起始页码不一致，请重新生成。")
+            number_ids = [ref.idnum for ref in PageNumberStamper(writer).stamp_all(on_page)]
+            output.write_chunk(writer)
+
+        with profile.stage('write', school=school_name) as span:
+            for chunk in content.chunks():
+                number_ids.extend(output.write_serialized(chunk))
+                if on_page:
+                    for _ in chunk.page_ids:
+                        on_page()
+            output.close()
+            span.pages = len(number_ids)
+            span.bytes_read = file_size(content.path)
+            span.bytes_written = file_size(output.path)
+        os.replace(output.path, save_path)
+    except BaseException:
+        output.abort()
+        raise
+    return number_ids
+
+
+def assemble_packet(cover, segments, content, school_name, save_path, on_page=None, readers=None, incremental=False,
+                    profile=NULL_PROFILE, streaming=False, optimize=False):
+    """
+    为某一院校生成材料包：渲染封面目录并添加页码，接上所有院校共用的内容页 content 后写入 save_path。
+    content 为 SharedContent，或返回它的函数（只在确实需要完整生成时才调用）。
+    on_page() 在封面目录每页添加页码后和内容页每页写出后各调用一次（增量更新时只对实际处理的页面调用）。
+    上次为同一院校完整生成的输出与本次内容完全相同时直接沿用，不重新写出。
+    incremental 为 True 且上次的输出仍然有效时，只在原文件末尾追加增量更新段。被替换或删除的材料仍留在文件中，
+    用 PDF 工具可以恢复，文件也随每次更新变大，因此只用于自己预览的草稿，默认总是完整重写。
+    streaming 为 True 时内容页是按块生成的，增量更新会把新页面全部留在内存中，此时只在输出已是最新时跳过生成，
+    否则直接完整生成。
+    optimize 为 True 时不使用 content，所有页面放进同一个写入器合并、添加页码，写出前做输出优化（见 optimize.py）
+    并打印节省的字节数；优化后的文件不能增量更新，不保存构建清单，总是完整生成。流式合并时忽略 optimize。
+    profile 记录各阶段的计量（见 profiling.BuildProfile）。
+    """
+    if streaming or not optimize:
+        manifest = load_manifest(save_path)
+        plan = plan_incremental(manifest, school_name, cover, segments, save_path)
+        # 没有增量更新段的输出不含旧版本内容，未改动时默认也可以直接沿用
+        if plan is not None and is_up_to_date(manifest, plan, cover, segments) and (
+                incremental or manifest['revisions'] == 0):
+            return save_path
+        if incremental and plan is not None and not streaming:
+            try:
+                with profile.stage('incremental_update', school=school_name) as span:
+                    size_before = file_size(save_path)
+                    number_ids = update_packet(cover, segments, school_name, save_path, plan, on_page, readers)
+                    span.pages = len(number_ids)
+                    span.bytes_written = file_size(save_path) - size_before
+                save_manifest(save_path, school_name, cover, segments, number_ids, manifest['revisions'] + 1)
+                print(f"{school_name}: 已增量更新，被替换或删除的材料仍留在文件中，提交前请完整生成一次。")
+                return save_path
+            except BuildCancelled:
+                raise
+            except Exception as e:
+                print(f"增量更新失败，改为完整生成: {e}")
+
+        remove_manifest(save_path)
+        if callable(content):
+            content = content()
+        number_ids = write_packet(cover, segments, content, school_name, save_path, on_page, profile)
+        save_manifest(save_path, school_name, cover, segments, number_ids)
+        return save_path
+
+    remove_manifest(save_path)
+    final_merger = PdfWriter()
+    with profile.stage('toc', school=school_name) as span:
+        cover.render(final_merger, school_name, cover.toc_entries(segments))
+        span.pages = len(final_merger.pages)
+    with profile.stage('merge', school=school_name) as span:
+        append_segments(final_merger, segments, readers, on_page)
+        span.pages = sum(segment['pages'] for segment in segments)
+        span.bytes_read = sum(file_size(path) for path in {segment['path'] for segment in segments})
+    with profile.stage('numbering', school=school_name) as span:
+        number_refs = add_page_numbers(final_merger, on_page)
+        span.pages = len(number_refs)
+    with profile.stage('optimize', school=school_name) as span:
+        report = optimize_and_write(final_merger, save_path)
+        span.pages = len(final_merger.pages)
+        span.bytes_written = report.output_size
+        span.args['bytes_saved'] = report.bytes_saved
+    print(f"{school_name}: {report.summary()}")
+    return save_path
+
+
+def update_packet(cover, segments, school_name, save_path, plan, on_page=None, readers=None):
+    """
+    按 plan（见 manifest.plan_incremental）增量更新已有的材料包：重新渲染封面目录，
+    只追加有变化的材料，沿用其余材料的原有页面，并只替换页码发生变化的页码内容流。
+    修改以增量更新段的形式追加在原文件末尾，沿用的页面既不解析也不重新写出。
+    返回按页序排列的页码内容流对象编号。
+    """
+    update = IncrementalUpdate(save_path)
+    writer = update.writer
+    old_refs = update.page_refs()
+    cover.render(writer, school_name, cover.toc_entries(segments))
+    # (页面引用, 旧页码, 旧页码内容流编号)，新页面的后两项为 None
+    entries = [(page.indirect_reference, None, None) for page in writer.pages]
+
+    for segment, item in zip(segments, plan):
+        if item is None:
+            count = len(writer.pages)
+            append_segments(writer, [segment], readers, on_page)
+            entries.extend((page.indirect_reference, None, None) for page in writer.pages[count:])
+        else:
+            start = item['output_start']
+            entries.extend((old_refs[start + k], start + k + 1, number_id)
+                           for k, number_id in enumerate(item['number_streams']))
+
+    stamper = PageNumberStamper(writer)
+    number_ids = []
+    for number, (ref, old_number, number_id) in enumerate(entries, start=1):
+        if old_number is None:
+            number_id = stamper.stamp(ref.get_object(), number).idnum
+        elif old_number != number:
+            update.replace_stream(number_id, stamper.number_stream(number))
+        number_ids.append(number_id)
+        if old_number != number and on_page:
+            on_page()
+
+    update.set_pages([ref for ref, _, _ in entries])
+    update.write()
+    return number_ids
+
+
+def default_workers():
+    """默认的并行转换数：不超过 4，避免同时启动过多 Word 进程"""
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+# Windows 文件名中不允许的字符和设备名
+INVALID_FILE_NAME_CHARACTERS = set('<>:"/\\|?*') | {chr(code) for code in range(32)}
+RESERVED_FILE_NAMES = {'CON', 'PRN', 'AUX', 'NUL'} | {f"{prefix}{n}" for prefix in ('COM', 'LPT') for n in range(1, 10)}
+
+
+def packet_file_name(school_name):
+    return f"{school_name}-申请材料.pdf"
+
+
+def validate_school_names(school_names):
+    """
+    院校名称会成为输出文件名：拒绝空名称、含路径分隔符或 Windows 不允许的字符的名称，
+    以及重名（不区分大小写，Windows 和 macOS 上会写到同一个文件）。
+    """
+    seen = {}
+    for school_name in school_names:
+        if not school_name.strip():
+            raise Exception("院校名称不能为空。")
+        invalid = sorted(set(school_name) & INVALID_FILE_NAME_CHARACTERS)
+        if invalid:
+            shown = ' '.join(repr(c) if c.isprintable() else f"\\x{ord(c):02x}" for c in invalid)
+            raise Exception(f"院校名称 '{school_name}' 含有不能用于文件名的字符: {shown}")
+        if school_name != school_name.rstrip(' .'):
+            raise Exception(f"院校名称 '{school_name}' 不能以空格或句点结尾。")
+        if school_name.split('.')[0].strip().upper() in RESERVED_FILE_NAMES:
+            raise Exception(f"院校名称 '{school_name}' 是 Windows 保留的设备名，不能用作文件名。")
+        key = school_name.casefold()
+        if key in seen:
+            raise Exception(f"院校名称重复: '{seen[key]}' 和 '{school_name}' 会生成同一个输出文件。")
+        seen[key] = school_name
+
+
+class ProgressTracker:
+    """
+    按实际工作量（字节、页数）加权的进度。
+    中途修正总工作量时，已显示的百分比保持不变，剩余进度按新的总量重新分配，进度条不会倒退。
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.reset(1)
+
+    def reset(self, total):
+        self.total = max(total, 1)
+        self.done = 0
+        self._base_percent = 0.0
+        self._base_done = 0
+        self._last = None
+
+    def set_total(self, total):
+        self._base_percent = self.percent()
+        self._base_done = self.done
+        self.total = max(total, self.done)
+
+    def percent(self):
+        remaining = self.total - self._base_done
+        if remaining <= 0:
+            return 100.0
+        return min(100.0, self._base_percent + (self.done - self._base_done) / remaining * (100 - self._base_percent))
+
+    def advance(self, units, message):
+        self.done = min(self.done + units, self.total)
+        state = (int(self.percent()), message)
+        if self.callback and state != self._last:
+            self._last = state
+            self.callback(*state)
+
+
+class PacketBuilder:
+    """
+    与界面无关的材料包生成引擎。
+    所有院校共享的内容（材料转换、封面模板转换、页数统计，以及内容页的合并和页码）只处理一次，
+    之后每个目标院校只需渲染封面目录并添加页码，再原样接上共用的内容页（见 build_shared_content）。
+    incremental 为 True 时，输出文件已存在且与构建清单一致的院校只做增量更新（会在文件中留下旧内容，
+    见 assemble_packet），默认总是完整重写；缓存的转换结果和元数据在两种方式下都会复用。
+    传入 profile（profiling.BuildProfile）时记录每个阶段和每个文件转换的计量。
+    streaming 为 True / False 时强制使用或不使用内存有界的流式合并，为 None 时按材料总大小自动决定。
+    optimize 为 True 时对输出做体积优化（见 assemble_packet）。
+    image_settings 可以为个别图片指定 {原路径: (目标 DPI, JPEG 质量)}，其余图片使用 target_dpi 和 jpeg_quality。
+    """
+    def __init__(self, template_path, work_dir, progress_callback=None, cache=None, converter=None,
+                 workers=1, executor_kind='thread', target_dpi=DEFAULT_TARGET_DPI, jpeg_quality=DEFAULT_JPEG_QUALITY,
+                 incremental=False, metadata=None, profile=None, streaming=None, optimize=False, image_settings=None):
+        if executor_kind not in EXECUTOR_KINDS:
+            raise Exception(f"未知的并行方式: {executor_kind}（可选: {', '.join(EXECUTOR_KINDS)}）")
+        self.template_path = template_path
+        self.work_dir = work_dir
+        self.progress_callback = progress_callback
+        self.cache = cache
+        self.converter = converter or get_shared_pool()
+        self.workers = max(1, workers)
+        self.executor_kind = executor_kind
+        self.target_dpi = target_dpi
+        self.jpeg_quality = jpeg_quality
+        self.incremental = incremental
+        self.metadata = metadata
+        self.profile = profile or NULL_PROFILE
+        self.streaming = streaming
+        self.use_streaming = bool(streaming)
+        self.optimize = optimize
+        self.image_settings = image_settings or {}
+        self.segments = []
+        self.content_page_count = 0
+        self._readers = {}
+        self._content = None
+        self._packets_start = 0
+        self._packets_done = 0
+        self.cover = None
+        self.toc_entries = []
+        self.progress = ProgressTracker(progress_callback)
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """请求取消生成，可从其他线程调用；引擎会在下一个检查点抛出 BuildCancelled"""
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def _check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise BuildCancelled("操作已取消")
+
+    def _conversion_cost(self, job):
+        try:
+            size = os.path.getsize(job['source'])
+        except OSError:
+            size = 0  # 文件缺失时由转换步骤报告具体错误
+        if job['kind'] == 'word':
+            return WORD_CONVERSION_COST + size / WORD_BYTES_PER_UNIT
+        if job['kind'] == 'image':
+            return 1 + size / IMAGE_BYTES_PER_UNIT
+        return 1 + size / PDF_BYTES_PER_UNIT
+
+    def _packets_cost(self, school_count, cover_pages, content_pages):
+        """
+        school_count 份材料包的工作量：共用的内容页逐页合并、添加页码一次，每份材料包渲染封面目录、
+        为封面目录添加页码并逐页写出内容页；优化输出时（流式合并时不优化）每份材料包都要重新逐页合并和添加页码。
+        """
+        if self.optimize and not self.use_streaming:
+            return school_count * (COVER_RENDER_COST + 2 * (cover_pages + content_pages))
+        return 2 * content_pages + school_count * (COVER_RENDER_COST + cover_pages + content_pages)
+
+    def _plan_conversions(self, material_paths):
+        """为每个材料确定转换方式，返回按最终顺序排列的任务列表"""
+        jobs = []
+        for index, original_path in enumerate(material_paths, start=1):
+            item_name = os.path.basename(original_path)
+            target_dpi, jpeg_quality = self.image_settings.get(original_path, (self.target_dpi, self.jpeg_quality))
+            kind, settings = conversion_settings(original_path, self.converter.backend_name, target_dpi, jpeg_quality)
+            if kind is None:
+                continue
+            jobs.append({
+                'title': os.path.splitext(item_name)[0],
+                'name': item_name,
+                'kind': kind,
+                'source': original_path,
+                'target': os.path.join(self.work_dir, f"{index}_{item_name}.pdf"),
+                'settings': settings,
+                'target_dpi': target_dpi,
+                'jpeg_quality': jpeg_quality,
+            })
+        for job in jobs:
+            job['cost'] = self._conversion_cost(job)
+            job['fingerprint'] = source_fingerprint(job['source'], job['settings'])
+        return jobs
+
+    def _convert_jobs(self, jobs):
+        """
+        把所有材料转换为PDF，返回按原顺序排列的 [(标题, PDF路径)]。
+        转换任务分发到线程池（图片转换可选进程池）中并行执行，完成一个报告一个；
+        任一文件失败时取消其余尚未开始的任务，并等待正在进行的任务结束后再抛出异常。
+        """
+        results = [None] * len(jobs)
+        if self.workers > 1:
+            self.converter.ensure_size(self.workers)
+
+        thread_pool = ThreadPoolExecutor(max_workers=self.workers)
+        process_pool = None
+        if self.executor_kind == 'process' and self.workers > 1 and any(job['kind'] == 'image' for job in jobs):
+            process_pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        futures = {}
+        try:
+            for i, job in enumerate(jobs):
+                self._check_cancelled()
+                if job['kind'] == 'pdf':
+                    # PDF 原件无需转换，直接就地读取
+                    results[i] = (job['title'], job['source'])
+                    self.progress.advance(job['cost'], f"正在处理: {job['name']}")
+                    continue
+                if self.cache is not None:
+                    cached_path, measurement = timed_call(self.cache.get, job['source'], job['settings'])
+                    if cached_path:
+                        results[i] = (job['title'], cached_path)
+                        job['span'] = self.profile.add_file(job['name'], measurement, kind=job['kind'], cache='hit')
+                        self.progress.advance(job['cost'], f"正在处理: {job['name']}")
+                        continue
+                if job['kind'] == 'image':
+                    convert = functools.partial(convert_image_to_pdf, target_dpi=job['target_dpi'],
+                                                jpeg_quality=job['jpeg_quality'])
+                    future = (process_pool or thread_pool).submit(timed_call, convert, job['source'], job['target'])
+                else:
+                    future = thread_pool.submit(timed_call, self.converter.convert, job['source'], job['target'])
+                futures[future] = i
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                self._check_cancelled()
+                for future in done:
+                    i = futures[future]
+                    job = jobs[i]
+                    _, measurement = future.result()
+                    job['span'] = self.profile.add_file(job['name'], measurement, kind=job['kind'],
+                                                        bytes_read=file_size(job['source']),
+                                                        bytes_written=file_size(job['target']))
+                    if self.cache is not None:
+                        self.cache.put(job['source'], job['settings'], job['target'])
+                    results[i] = (job['title'], job['target'])
+                    self.progress.advance(job['cost'], f"正在处理: {job['name']}")
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            thread_pool.shutdown(wait=True, cancel_futures=True)
+            if process_pool is not None:
+                process_pool.shutdown(wait=True, cancel_futures=True)
+            if self.cache is not None:
+                self.cache.save()
+        return results
+
+    def prepare_content(self, material_paths, school_count=1):
+        """
+        转换所有材料和封面模板，统计页数并计算目录页码。
+        PDF 原件和缓存中的转换结果都直接就地读取，页面在生成每份材料包时才写入最终文件；
+        页数和横向页优先从元数据索引中获取，只有索引中没有的文件才需要解析。
+        """
+        if os.path.exists(self.work_dir): shutil.rmtree(self.work_dir)
+        os.makedirs(self.work_dir)
+
+        jobs = self._plan_conversions(material_paths)
+        estimated_pages = ESTIMATED_PAGES_PER_ITEM * len(jobs)
+        self.progress.reset(sum(job['cost'] for job in jobs) + len(jobs) + WORD_CONVERSION_COST
+                            + self._packets_cost(school_count, 1, estimated_pages))
+
+        with self.profile.stage('convert') as convert_span:
+            converted_pdf_paths = self._convert_jobs(jobs)
+            converted = [job for job in jobs if job.get('span') is not None]
+            convert_span.bytes_read = sum(job['span'].bytes_read for job in converted)
+            convert_span.bytes_written = sum(job['span'].bytes_written for job in converted)
+        self._check_cancelled()
+        if self.streaming is None:
+            self.use_streaming = sum(file_size(path) for _, path in converted_pdf_paths) > STREAMING_AUTO_BYTES
+        else:
+            self.use_streaming = self.streaming
+
+        self.progress.advance(0, "准备封面和目录模板...")
+        with self.profile.stage('cover_template'):
+            self.cover = prepare_cover_template(self.template_path, self.converter, self.work_dir, self.cache)
+        if self.cache is not None:
+            # 模板的缓存条目在材料转换之后才登记，需要再保存一次索引
+            self.cache.save()
+        self.progress.advance(WORD_CONVERSION_COST, "准备封面和目录模板...")
+
+        self.segments = []
+        self._readers = {}
+        self._content = None
+        current_page_in_content = 1
+
+        with self.profile.stage('count_pages') as span:
+            for job, (title, path) in zip(jobs, converted_pdf_paths):
+                self._check_cancelled()
+                with reading_material(path):
+                    info, reader = self._read_material_info(job['fingerprint'], path)
+                if reader is not None:
+                    self._readers[path] = reader
+                    span.bytes_read += info['size']
+                num_pages_in_file = info['pages']
+                if job.get('span') is not None:
+                    job['span'].pages = num_pages_in_file
+                self.segments.append({'title': title, 'path': path, 'start': current_page_in_content, 'pages': num_pages_in_file,
+                                      'landscape': info['landscape'], 'fingerprint': job['fingerprint']})
+                current_page_in_content += num_pages_in_file
+                self.progress.advance(1, "统计页数并计算目录...")
+            span.pages = current_page_in_content - 1
+            convert_span.pages = sum(job['span'].pages for job in converted)
+
+        self.content_page_count = current_page_in_content - 1
+        if self.metadata is not None:
+            self.metadata.save()
+        self.toc_entries = self.cover.toc_entries(self.segments)
+        # 页数确定后按真实页数修正剩余工作量
+        self.progress.set_total(self.progress.done + self._packets_cost(school_count, self.cover.page_count(len(self.segments)),
+                                                                        self.content_page_count))
+        self._packets_start = self.progress.done
+        self._packets_done = 0
+        return self.segments
+
+    def _read_material_info(self, fingerprint, path):
+        """
+        读取材料的元数据，返回 (元数据, 打开的 PdfReader 或 None)。
+        流式模式下直接从文件按需读取，不把整个文件读入内存，也不保留读取器。
+        """
+        if self.use_streaming:
+            info = self.metadata.get(fingerprint) if self.metadata is not None else None
+            if info is None:
+                with open(path, 'rb') as f:
+                    info = pdf_metadata(PdfReader(f), path)
+                if self.metadata is not None:
+                    self.metadata.put(fingerprint, info)
+            return info, None
+        if self.metadata is not None:
+            return self.metadata.read(fingerprint, path)
+        reader = self._readers.get(path) or PdfReader(path)
+        return pdf_metadata(reader, path), reader
+
+    def packet_page_count(self):
+        """最终材料包的总页数（封面目录加全部材料）"""
+        return self.cover.page_count(len(self.segments)) + self.content_page_count
+
+    def shared_content(self):
+        """所有院校共用的内容页，第一次需要时才合并、添加页码（见 build_shared_content）"""
+        if self._content is None:
+            def on_page():
+                self._check_cancelled()
+                self.progress.advance(1, "合并材料并添加页码...")
+
+            with self.profile.stage('content') as span:
+                self._content = build_shared_content(
+                    self.segments, os.path.join(self.work_dir, 'content.chunks'),
+                    self.cover.page_count(len(self.segments)) + 1, self._readers,
+                    STREAM_CHUNK_PAGES if self.use_streaming else None, on_page)
+                span.pages = self._content.page_count
+                span.bytes_read = sum(file_size(path) for path in {segment['path'] for segment in self.segments})
+                span.bytes_written = file_size(self._content.path)
+        return self._content
+
+    def _packet_done(self, school_name):
+        """一份材料包完成后把进度补齐到预计位置；增量更新或直接沿用时跳过的页面、没有用到的共用内容页都计入"""
+        self._packets_done += 1
+        target = self._packets_start + self._packets_cost(self._packets_done, self.cover.page_count(len(self.segments)),
+                                                          self.content_page_count)
+        self.progress.advance(max(0, target - self.progress.done), f"已完成: {school_name}")
+
+    def build_packet(self, school_name, save_path):
+        """为单个院校生成最终材料包"""
+        if self.cover is None:
+            raise Exception("尚未准备共享内容，请先调用 prepare_content。")
+        self._check_cancelled()
+        self.progress.advance(COVER_RENDER_COST, f"创建精美目录页: {school_name}")
+
+        def on_page():
+            self._check_cancelled()
+            self.progress.advance(1, f"最终合并并添加页码: {school_name}")
+
+        assemble_packet(self.cover, self.segments, self.shared_content, school_name, save_path, on_page=on_page,
+                        readers=self._readers, incremental=self.incremental, profile=self.profile,
+                        streaming=self.use_streaming, optimize=self.optimize)
+        self._packet_done(school_name)
+        return save_path
+
+    def build_many(self, material_paths, school_names, output_dir, workers=1):
+        """
+        为多个院校批量生成材料包。共享内容只转换、合并并添加页码一次；
+        workers 大于 1 时先生成共用的内容页，各院校的材料包再在多个进程中并行生成。
+        返回 {院校名称: 输出路径}。
+        """
+        validate_school_names(school_names)
+        self.prepare_content(material_paths, school_count=len(school_names))
+        os.makedirs(output_dir, exist_ok=True)
+        jobs = [(school_name, os.path.join(output_dir, packet_file_name(school_name))) for school_name in school_names]
+
+        results = {}
+        if workers <= 1:
+            for school_name, save_path in jobs:
+                results[school_name] = self.build_packet(school_name, save_path)
+            return results
+
+        content = None if self.optimize and not self.use_streaming else self.shared_content()
+        with self.profile.stage('packets', workers=workers), ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(assemble_packet, self.cover, self.segments, content, school_name, save_path,
+                                incremental=self.incremental, streaming=self.use_streaming,
+                                optimize=self.optimize): school_name
+                for school_name, save_path in jobs
+            }
+            try:
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    self._check_cancelled()
+                    for future in done:
+                        school_name = futures[future]
+                        results[school_name] = future.result()
+                        self._packet_done(school_name)
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+        return results
+
+    def cleanup(self):
+        self._readers = {}
+        if os.path.exists(self.work_dir):
+            shutil.rmtree(self.work_dir)
@@ -0,0 +1,93 @@
+"""
+封面目录使用的 Windows 中文字体。
+
+reportlab 的 TTFont 在构造时就解析整个字体文件，simsun.ttc 这样的大字体要花不少时间，
+而启动界面和扫描材料都用不到字体，因此推迟到第一次渲染封面目录时才注册（图形界面在窗口显示后于后台预先注册）。
+解析结果保存在缓存目录中，字体文件和 reportlab 版本都未变时下次直接载入，不再重新解析。
+"""
+import os
+import pickle
+import hashlib
+import threading
+from weakref import WeakKeyDictionary
+
+from reportlab import Version as REPORTLAB_VERSION
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace
+
+from cache import app_cache_path
+
+WINDOWS_FONTS = [('SimHei', 'C:/Windows/Fonts/simhei.ttf'), ('SimSun', 'C:/Windows/Fonts/simsun.ttc')]
+# 修改序列化方式时请提升版本，旧的解析缓存随之失效
+FONT_CACHE_VERSION = 1
+FONT_CACHE_DIRECTORY = 'fonts'
+
+_lock = threading.Lock()
+_registered = False
+
+
+def font_cache_path(name, font_path, cache_dir=None):
+    stat = os.stat(font_path)
+    key = f"{FONT_CACHE_VERSION}|{REPORTLAB_VERSION}|{name}|{os.path.abspath(font_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    directory = os.path.join(cache_dir, FONT_CACHE_DIRECTORY) if cache_dir else app_cache_path(FONT_CACHE_DIRECTORY)
+    return os.path.join(directory, f"{digest}.pickle")
+
+
+def _dump_font(font, path):
+    """TTFont 中有 lambda 和弱引用字典，不能直接序列化；只保存解析出的数据，载入时再补上"""
+    face = {key: value for key, value in vars(font.face).items() if key != '_pdfScale'}
+    state = {key: value for key, value in vars(font).items() if key not in ('face', 'state')}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'font': state, 'face': face}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _load_font(path):
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    face = TTFontFace.__new__(TTFontFace)
+    face.__dict__.update(data['face'])
+    scale = 1000 / face.unitsPerEm
+    face._pdfScale = (lambda x: x) if face.unitsPerEm == 1000 else (lambda x: x * scale)
+    font = TTFont.__new__(TTFont)
+    font.__dict__.update(data['font'])
+    font.face = face
+    font.state = WeakKeyDictionary()
+    return font
+
+
+def load_font(name, font_path, cache_dir=None):
+    """返回解析好的 TTFont；解析缓存可用时直接载入，缓存目录不可用时照常解析"""
+    try:
+        cache_path = font_cache_path(name, font_path, cache_dir)
+    except OSError:
+        cache_path = None  # 字体文件不存在时由 TTFont 报告具体错误
+    if cache_path is not None and os.path.exists(cache_path):
+        try:
+            return _load_font(cache_path)
+        except Exception as e:
+            print(f"字体解析缓存无法载入，重新解析: {e}")
+    font = TTFont(name, font_path)
+    if cache_path is not None:
+        try:
+            _dump_font(font, cache_path)
+        except OSError as e:
+            print(f"无法写入字体解析缓存: {e}")
+    return font
+
+
+def register_fonts(cache_dir=None):
+    """注册 Windows 中文字体，只在第一次调用时执行；字体不可用时打印警告，渲染时退回 reportlab 内置字体"""
+    global _registered
+    with _lock:
+        if _registered:
+            return
+        _registered = True
+        for name, font_path in WINDOWS_FONTS:
+            try:
+                pdfmetrics.registerFont(load_font(name, font_path, cache_dir))
+            except Exception as e:
+                print(f"字体注册警告: {e}")
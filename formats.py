@@ -0,0 +1,8 @@
+"""
+支持的材料格式。
+
+独立于 engine，界面扫描材料文件夹时只需要扩展名，不必在启动时导入 PDF 处理库。
+"""
+SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.doc', '.jpg', '.jpeg', '.png']
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+WORD_EXTENSIONS = ['.doc', '.docx']
@@ -0,0 +1,144 @@
+"""
+图片材料的处理：按 A4 上的实际摆放尺寸和目标 DPI 降采样后再嵌入 PDF。
+
+手机拍摄的证书扫描件往往有 1200~4800 万像素，原样嵌入会让材料包达到几十 MB。
+这里先用 Pillow 的 draft 模式在 JPEG 解码阶段直接缩小，再精确缩放到所需像素；
+已经足够小、方向正确的 JPEG 则原样嵌入，不重新编码。
+"""
+import os
+import io
+import threading
+from contextlib import contextmanager
+
+from PIL import Image, ImageOps
+from reportlab import rl_config
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+
+DEFAULT_TARGET_DPI = 200
+DEFAULT_JPEG_QUALITY = 85
+PAGE_MARGIN = 0.5 * inch
+EXIF_ORIENTATION = 0x0112
+
+# 像素数不超过所需值的这个倍数时，认为图片已经足够小
+PASSTHROUGH_TOLERANCE = 1.1
+
+
+_a85_lock = threading.Lock()
+_a85_users = 0
+_a85_saved = None
+
+
+@contextmanager
+def binary_streams():
+    """
+    reportlab 默认把图片和内容流再做一次 ASCII85 编码，体积会增加约 25%，二进制 PDF 不需要。
+    这是 reportlab 的全局设置，只在用 reportlab 生成页面期间关闭，结束后恢复；多个线程同时生成时由最后一个恢复。
+    """
+    global _a85_users, _a85_saved
+    with _a85_lock:
+        if _a85_users == 0:
+            _a85_saved = rl_config.useA85
+            rl_config.useA85 = 0
+        _a85_users += 1
+    try:
+        yield
+    finally:
+        with _a85_lock:
+            _a85_users -= 1
+            if _a85_users == 0:
+                rl_config.useA85 = _a85_saved
+
+
+def placement(img_width, img_height, page_size=A4, margin=PAGE_MARGIN):
+    """计算图片在页面上居中放置的位置和尺寸（单位：点），返回 (x, y, 宽, 高)"""
+    page_width, page_height = page_size
+    max_width = page_width - 2 * margin
+    max_height = page_height - 2 * margin
+    ratio = min(max_width / img_width, max_height / img_height)
+    new_width = img_width * ratio
+    new_height = img_height * ratio
+    return (page_width - new_width) / 2, (page_height - new_height) / 2, new_width, new_height
+
+
+def _orientation(img):
+    try:
+        return img.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception:
+        return 1
+
+
+def _flatten(img):
+    """去掉透明通道（铺白底），并转换为 PDF 可直接嵌入的颜色模式"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        background = Image.new('RGB', rgba.size, 'white')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    if img.mode not in ('RGB', 'L', 'CMYK'):
+        return img.convert('RGB')
+    return img
+
+
+def is_jpeg(img_path):
+    """只读文件头判断图片是否为 JPEG；只有 JPEG 会按 jpeg_quality 重新编码，其他格式保持无损"""
+    try:
+        with Image.open(img_path) as img:
+            return img.format == 'JPEG'
+    except Exception:
+        return False
+
+
+def load_image(img_path, target_dpi=DEFAULT_TARGET_DPI, jpeg_quality=DEFAULT_JPEG_QUALITY):
+    """
+    读取图片并按目标 DPI 处理，返回 (可交给 reportlab 的图片, 显示宽度像素, 显示高度像素, 页面摆放)。
+    target_dpi 为 None 时保留原始分辨率（仍会处理 EXIF 方向）。
+    """
+    with Image.open(img_path) as img:
+        orientation = _orientation(img)
+        swapped = orientation in (5, 6, 7, 8)
+        width, height = (img.height, img.width) if swapped else img.size
+        box = placement(width, height)
+
+        if target_dpi:
+            target_width = max(1, round(box[2] / 72 * target_dpi))
+            target_height = max(1, round(box[3] / 72 * target_dpi))
+        else:
+            target_width, target_height = width, height
+        small_enough = width <= target_width * PASSTHROUGH_TOLERANCE and height <= target_height * PASSTHROUGH_TOLERANCE
+
+        if img.format == 'JPEG' and orientation == 1 and small_enough and img.mode in ('RGB', 'L', 'CMYK'):
+            return img_path, width, height, box
+
+        jpeg = img.format == 'JPEG'
+        if jpeg and not small_enough:
+            # draft 让 JPEG 解码器直接按 1/2、1/4、1/8 缩小，避免完整解码上千万像素
+            img.draft(img.mode, (target_height, target_width) if swapped else (target_width, target_height))
+        img = ImageOps.exif_transpose(img)
+        if not small_enough:
+            img.thumbnail((target_width, target_height), Image.Resampling.LANCZOS)
+        img = _flatten(img)
+
+        if jpeg:
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=jpeg_quality)
+            buffer.seek(0)
+            return ImageReader(buffer), width, height, box
+        # PNG 等无损格式保持无损，交给 reportlab 以 Flate 压缩嵌入
+        img.load()
+        return ImageReader(img), width, height, box
+
+
+def convert_image_to_pdf(img_path, pdf_path, target_dpi=DEFAULT_TARGET_DPI, jpeg_quality=DEFAULT_JPEG_QUALITY):
+    try:
+        image, _, _, (x, y, width, height) = load_image(img_path, target_dpi, jpeg_quality)
+        with binary_streams():
+            c = canvas.Canvas(pdf_path, pagesize=A4)
+            c.drawImage(image, x, y, width=width, height=height, preserveAspectRatio=True)
+            c.save()
+        return True
+    except Exception as e:
+        raise Exception(f"转换图片失败 {os.path.basename(img_path)}: {e}")
+
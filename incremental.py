@@ -0,0 +1,137 @@
+"""
+在已有 PDF 的末尾追加增量更新段。
+
+旧文件只读取交叉引用表和页面树根，不解析整个文档；
+新内容写入一个普通的 PdfWriter，其对象编号从旧文件的 /Size 开始，与旧对象互不冲突。
+写出时只序列化新对象和被替换的旧对象，连同新的交叉引用表一起追加到文件末尾，原有字节保持不变。
+"""
+import io
+import os
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+PDF_HEADER = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+
+
+def write_object(stream, idnum, obj, generation=0):
+    """写出一个间接对象；obj 可以是已经序列化好的 bytes"""
+    stream.write(f"{idnum} {generation} obj\n".encode())
+    if isinstance(obj, bytes):
+        stream.write(obj)
+    else:
+        obj.write_to_stream(stream)
+    stream.write(b"\nendobj\n")
+
+
+def write_xref_table(stream, entries):
+    """
+    写出经典交叉引用表，连续的编号合并为一个子段。
+    entries 为 {对象编号: (偏移, 代数)}；编号 0 是空闲链表头，按空闲项写出。
+    """
+    stream.write(b"xref\n")
+    ids = sorted(entries)
+    first = 0
+    while first < len(ids):
+        last = first
+        while last + 1 < len(ids) and ids[last + 1] == ids[last] + 1:
+            last += 1
+        stream.write(f"{ids[first]} {last - first + 1}\n".encode())
+        for idnum in ids[first:last + 1]:
+            offset, generation = entries[idnum]
+            stream.write(f"{offset:0>10} {generation:0>5} {'f' if idnum == 0 else 'n'} \n".encode())
+        first = last + 1
+
+
+class IncrementalUpdate:
+    def __init__(self, path):
+        self.path = path
+        self.reader = PdfReader(path)
+        self.size = int(self.reader.trailer['/Size'])
+        self.writer = PdfWriter()
+        reserved = self.size - 1 - len(self.writer._objects)
+        if reserved < 0:
+            raise Exception("文件对象过少，无法增量更新。")
+        # 占住旧文件已使用的编号，之后新建的对象编号都从 /Size 开始
+        self.writer._objects.extend([None] * reserved)
+        self.pages_ref = self.reader.trailer['/Root'].get_object().raw_get('/Pages')
+        self._replaced = {}
+
+    def page_refs(self):
+        """旧文件中按顺序排列的页面引用。只支持单层页面树（本程序生成的文件都是如此）"""
+        root = self.pages_ref.get_object()
+        kids = list(root['/Kids'])
+        if len(kids) != root['/Count']:
+            raise Exception("页面树不是单层结构，无法增量更新。")
+        return kids
+
+    def replace(self, ref, obj):
+        """用 obj 替换旧文件中的对象 ref"""
+        self._replaced[ref.idnum] = (ref.generation, obj)
+
+    def replace_stream(self, idnum, data):
+        """直接替换旧文件中的一个内容流对象，引用它的页面无需读取或改写"""
+        stream = DecodedStreamObject()
+        stream.set_data(data)
+        self.replace(IndirectObject(idnum, 0, self.reader), stream)
+
+    def set_pages(self, page_refs):
+        """按 page_refs 的顺序重写页面树，不在其中的旧页面随之移除"""
+        root = DictionaryObject(self.pages_ref.get_object())
+        root[NameObject('/Kids')] = ArrayObject(page_refs)
+        root[NameObject('/Count')] = NumberObject(len(page_refs))
+        for ref in page_refs:
+            if ref.pdf is self.writer:
+                ref.get_object()[NameObject('/Parent')] = self.pages_ref
+        self.replace(self.pages_ref, root)
+
+    def _check_refs(self, obj):
+        """写出的对象只能引用旧文件或本次新建的对象，否则编号会指向错误的对象"""
+        if isinstance(obj, IndirectObject):
+            if obj.pdf is not self.writer and obj.pdf is not self.reader:
+                raise Exception("增量更新中存在无法解析的对象引用。")
+        elif isinstance(obj, DictionaryObject):
+            for value in obj.values():
+                self._check_refs(value)
+        elif isinstance(obj, ArrayObject):
+            for value in obj:
+                self._check_refs(value)
+
+    def write(self):
+        objects = {idnum: (generation, obj) for idnum, (generation, obj) in self._replaced.items()}
+        for index in range(self.size - 1, len(self.writer._objects)):
+            obj = self.writer._objects[index]
+            if obj is not None:
+                objects[index + 1] = (0, obj)
+
+        with open(self.path, 'r+b') as f:
+            start = f.seek(0, os.SEEK_END)
+            buffer = io.BytesIO()
+            buffer.write(b"\n")
+            positions = {}
+            for idnum in sorted(objects):
+                generation, obj = objects[idnum]
+                self._check_refs(obj)
+                positions[idnum] = (start + buffer.tell(), generation)
+                write_object(buffer, idnum, obj, generation)
+
+            xref_location = start + buffer.tell()
+            write_xref_table(buffer, positions)
+
+            trailer = DictionaryObject({
+                NameObject('/Size'): NumberObject(max(self.size, max(positions) + 1)),
+                NameObject('/Root'): self.reader.trailer.raw_get('/Root'),
+                NameObject('/Prev'): NumberObject(self.reader._startxref),
+            })
+            for key in ('/Info', '/ID'):
+                if key in self.reader.trailer:
+                    trailer[NameObject(key)] = self.reader.trailer.raw_get(key)
+            buffer.write(b"trailer\n")
+            trailer.write_to_stream(buffer)
+            buffer.write(f"\nstartxref\n{xref_location}\n%%EOF\n".encode())
+            try:
+                f.write(buffer.getvalue())
+            except BaseException:
+                # 写到一半失败时截回原长度，文件仍是上一个完整版本
+                f.truncate(start)
+                raise
@@ -0,0 +1,163 @@
+"""
+材料库：按完整路径记录已添加文件夹（含子文件夹）中的材料。
+
+首次添加文件夹时在后台线程中用 os.scandir 递归扫描，结果分批交给界面；
+之后文件系统监视器只通知哪个目录发生了变化，这里重新列出该目录并与已知内容比较，
+得出新增、删除和重命名的文件，不必重新扫描整个文件夹。
+"""
+import os
+
+from formats import SUPPORTED_EXTENSIONS
+
+MATERIAL_EXTENSIONS = frozenset(SUPPORTED_EXTENSIONS)
+SCAN_BATCH_SIZE = 200
+
+
+def is_material(name):
+    return os.path.splitext(name)[1].lower() in MATERIAL_EXTENSIONS
+
+
+def list_directory(directory):
+    """
+    非递归地列出一个目录，返回 ({材料路径: (大小, 修改时间)}, [子目录路径])。
+    不跟随指向目录的符号链接，避免循环；目录不可读时返回空结果。
+    """
+    files, subdirectories = {}, []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif is_material(entry.name) and entry.is_file():
+                        stat = entry.stat()
+                        files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files, subdirectories
+
+
+def scan_materials(root, batch_size=SCAN_BATCH_SIZE, is_cancelled=None):
+    """
+    递归扫描 root，分批产出 (本批新访问的目录, [(材料路径, 签名)])。
+    同一目录内按名称排序，子目录按深度优先的顺序紧随其后。
+    """
+    stack = [os.path.normpath(os.path.abspath(root))]
+    directories, files = [], []
+    while stack:
+        if is_cancelled and is_cancelled():
+            return
+        directory = stack.pop()
+        found, subdirectories = list_directory(directory)
+        directories.append(directory)
+        files.extend(sorted(found.items()))
+        stack.extend(sorted(subdirectories, reverse=True))
+        while len(files) >= batch_size:
+            yield directories, files[:batch_size]
+            directories, files = [], files[batch_size:]
+    if directories or files:
+        yield directories, files
+
+
+class MaterialLibrary:
+    """已知的材料文件（完整路径 -> 签名）及其所在目录，签名用于识别重命名"""
+    def __init__(self):
+        self.files = {}
+        self.directories = set()
+        self._by_directory = {}
+
+    def __contains__(self, path):
+        return path in self.files
+
+    def covers(self, directory):
+        return os.path.normpath(directory) in self.directories
+
+    def add(self, directories, files):
+        """登记一批扫描结果，返回其中此前未知的文件路径"""
+        self.directories.update(directories)
+        added = []
+        for path, signature in files:
+            if path not in self.files:
+                self._add_file(path, signature)
+                added.append(path)
+        return added
+
+    def _add_file(self, path, signature):
+        self.files[path] = signature
+        self._by_directory.setdefault(os.path.dirname(path), set()).add(path)
+
+    def _remove_file(self, path):
+        self._by_directory.get(os.path.dirname(path), set()).discard(path)
+        return self.files.pop(path)
+
+    def _forget_tree(self, directory):
+        """移除目录及其所有子目录的记录，返回 (这些目录, [(其中的文件, 签名)])"""
+        prefix = directory + os.sep
+        gone = sorted(d for d in self.directories if d == directory or d.startswith(prefix))
+        removed = []
+        for d in gone:
+            self.directories.discard(d)
+            for path in sorted(self._by_directory.pop(d, ())):
+                removed.append((path, self.files.pop(path)))
+        return gone, removed
+
+    def rename(self, old_path, new_path):
+        """记录程序自身执行的重命名，之后监视器再报告该目录变化时不会重复处理"""
+        if old_path in self.files:
+            self._add_file(new_path, self._remove_file(old_path))
+
+    def refresh(self, directories):
+        """
+        重新列出发生变化的目录并与已知内容比较，返回变化：
+        {'added', 'removed', 'renamed': [(旧路径, 新路径)], 'modified', 'new_directories', 'removed_directories'}。
+        大小和修改时间都相同的一删一增视为重命名；新出现的子目录需要调用方另行递归扫描。
+        """
+        removed, added, modified = [], [], []
+        new_directories, removed_directories = [], []
+        for directory in sorted(directories):
+            if directory not in self.directories:
+                continue
+            if not os.path.isdir(directory):
+                gone, files = self._forget_tree(directory)
+                removed_directories.extend(gone)
+                removed.extend(files)
+                continue
+            found, subdirectories = list_directory(directory)
+            known = set(self._by_directory.get(directory, ()))
+            for path in sorted(known - found.keys()):
+                removed.append((path, self._remove_file(path)))
+            for path in sorted(found.keys() - known):
+                added.append((path, found[path]))
+            for path in sorted(known & found.keys()):
+                if self.files[path] != found[path]:
+                    self.files[path] = found[path]
+                    modified.append(path)
+
+            children = {d for d in self.directories if os.path.dirname(d) == directory}
+            for subdirectory in sorted(children - set(subdirectories)):
+                gone, files = self._forget_tree(subdirectory)
+                removed_directories.extend(gone)
+                removed.extend(files)
+            new_directories.extend(d for d in sorted(subdirectories) if d not in self.directories)
+
+        # 只有签名在删除和新增两边都唯一时才认作重命名，否则按删除和新增处理
+        removed_by_signature, added_by_signature = {}, {}
+        for path, signature in removed:
+            removed_by_signature.setdefault(signature, []).append(path)
+        for path, signature in added:
+            added_by_signature.setdefault(signature, []).append(path)
+        changes = {'added': [], 'removed': [], 'renamed': [], 'modified': modified,
+                   'new_directories': new_directories, 'removed_directories': removed_directories}
+        for path, signature in removed:
+            if len(removed_by_signature[signature]) == 1 and len(added_by_signature.get(signature, ())) == 1:
+                changes['renamed'].append((path, added_by_signature[signature][0]))
+            else:
+                changes['removed'].append(path)
+        renamed_to = {new_path for _, new_path in changes['renamed']}
+        for path, signature in added:
+            self._add_file(path, signature)
+            if path not in renamed_to:
+                changes['added'].append(path)
+        return changes
@@ -1,36 +1,50 @@
 import sys
 import os
-import shutil
-import io
-import time
 import traceback # 导入用于打印详细错误信息的库
 import subprocess # 导入用于打开文件夹的库
+import queue
+import threading
 
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QPushButton, QLineEdit, QListWidget, QLabel,
+                             QPushButton, QLineEdit, QListWidget, QListWidgetItem, QLabel,
                              QFileDialog, QMessageBox, QProgressBar, QStyle,
-                             QMenu, QInputDialog, QDialog, QTextBrowser) # 新增导入 QDialog, QTextBrowser
-from PyQt6.QtCore import Qt
+                             QMenu, QInputDialog, QDialog, QTextBrowser,
+                             QStyledItemDelegate, QStyleOptionViewItem, QSpinBox) # 新增导入 QDialog, QTextBrowser
+from PyQt6.QtCore import Qt, QObject, QThread, QTimer, QFileSystemWatcher, pyqtSignal
 from PyQt6.QtGui import QIcon, QAction, QPixmap # 新增导入 QPixmap
 
-# --- 导入所有处理库 ---
-from pypdf import PdfWriter, PdfReader
-from PIL import Image
-import win32com.client
-from docx import Document
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_TAB_LEADER
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-try:
-    pdfmetrics.registerFont(TTFont('SimHei', 'C:/Windows/Fonts/simhei.ttf'))
-    pdfmetrics.registerFont(TTFont('SimSun', 'C:/Windows/Fonts/simsun.ttc'))
-except Exception as e:
-    print(f"字体注册警告: {e}")
+# --- 材料处理流程位于与界面无关的 engine 模块；它依赖的 PDF 处理库较重，用到时才导入（见 warm_up） ---
+from cache import ConversionCache
+from converters import default_backend_name
+from library import MaterialLibrary, scan_materials
+from metadata import MetadataIndex
+from profiling import BuildProfile
+from thumbnails import ThumbnailCache, THUMBNAIL_SIZE
+
+# 列表项中保存材料完整路径的数据角色；拖拽到右侧列表时会随项目一起复制
+MATERIAL_PATH_ROLE = Qt.ItemDataRole.UserRole
+# 文件夹连续变化时合并处理的等待时间（毫秒）
+FOLDER_CHANGE_DELAY = 300
+# 设置该环境变量后，每次生成都记录各阶段计量，并在输出文件旁写出 trace 文件；值为 memory 时另外开启 tracemalloc
+PROFILE_ENV = 'SCMG_PROFILE'
+PROFILE_MEMORY = 'memory'
+# 后台读到的页数合并后统一刷新到列表的间隔（毫秒）
+METADATA_REFRESH_DELAY = 100
+# 后台渲染缩略图的线程数
+THUMBNAIL_WORKERS = 2
+# 窗口显示后等待这么久（毫秒）再在后台预加载生成所需的模块和字体，不与首次绘制争抢
+WARM_UP_DELAY = 500
+
+
+def warm_up():
+    """在后台线程中预先导入 engine 及其依赖的 PDF 处理库并注册字体，点击生成时不必再等待"""
+    try:
+        import engine  # noqa: F401
+        from fonts import register_fonts
+        register_fonts()
+    except Exception as e:
+        print(f"预加载失败，将在生成时重试: {e}")
+
 
 # ==================== 新增功能：关于对话框 ====================
 class AboutDialog(QDialog):
@@ -97,11 +111,240 @@ class AboutDialog(QDialog):
         layout.addWidget(github_link_browser)
         layout.addWidget(close_button, alignment=Qt.AlignmentFlag.AlignHCenter)
 
+class GenerateWorker(QThread):
+    """
+    在后台线程中运行生成流程，通过信号把进度和结果传回界面线程。
+    """
+    progress = pyqtSignal(int, str)
+    succeeded = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, builder, material_paths, school_name, save_path, max_bytes=None, parent=None):
+        super().__init__(parent)
+        self.builder = builder
+        self.builder.progress.callback = self.progress.emit
+        self.material_paths = material_paths
+        self.school_name = school_name
+        self.save_path = save_path
+        self.max_bytes = max_bytes
+        self.budget_report = None
+
+    def cancel(self):
+        self.builder.cancel()
+
+    def run(self):
+        from engine import BuildCancelled
+        profile = self.builder.profile if isinstance(self.builder.profile, BuildProfile) else None
+        if profile is not None:
+            profile.start()
+        try:
+            if self.max_bytes:
+                from budget import build_within_budget
+                self.budget_report = build_within_budget(self.builder, self.material_paths,
+                                                         [(self.school_name, self.save_path)], self.max_bytes)
+                print(self.budget_report.summary())
+            else:
+                self.builder.prepare_content(self.material_paths)
+                self.builder.build_packet(self.school_name, self.save_path)
+            if self.builder.cache is not None:
+                print(self.builder.cache.stats_text())
+            self.succeeded.emit(self.save_path)
+        except BuildCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(str(e))
+        finally:
+            self.builder.cleanup()
+            if profile is not None:
+                profile.stop()
+                print(profile.summary_table())
+                try:
+                    profile.export_trace(self.save_path + '.trace.json')
+                except OSError as e:
+                    print(f"无法写出 trace 文件: {e}")
+
+
+class ScanWorker(QThread):
+    """在后台递归扫描材料文件夹，分批把 (目录列表, [(路径, 签名)]) 交给界面线程"""
+    batch_found = pyqtSignal(list, list)
+
+    def __init__(self, directories, parent=None):
+        super().__init__(parent)
+        self.directories = directories
+
+    def run(self):
+        for directory in self.directories:
+            for directories, files in scan_materials(directory, is_cancelled=self.isInterruptionRequested):
+                self.batch_found.emit(directories, files)
+
+
+class MetadataWorker(QThread):
+    """
+    在后台逐个读取材料的页数和横向页，结果记入元数据索引，再交给界面线程显示。
+    Word 文档不在这里转换，只有此前生成时转换过的才能从索引中查到页数。
+    """
+    metadata_ready = pyqtSignal(str, object)
+
+    def __init__(self, metadata, parent=None):
+        super().__init__(parent)
+        self.metadata = metadata
+        self.queue = queue.Queue()
+
+    def request(self, paths):
+        for path in paths:
+            self.queue.put(path)
+
+    def stop(self):
+        """放弃尚未读取的材料并结束线程"""
+        self.requestInterruption()
+        self.queue.put(None)
+
+    def run(self):
+        from engine import material_metadata
+        backend_name = default_backend_name()
+        while True:
+            path = self.queue.get()
+            if path is None or self.isInterruptionRequested():
+                break
+            try:
+                info = material_metadata(path, self.metadata, backend_name)
+            except Exception:
+                # 无法读取的文件不显示页数，生成时再报告具体错误
+                info = None
+            self.metadata_ready.emit(path, info)
+            if self.queue.empty():
+                self.metadata.save()
+        self.metadata.save()
+
+
+class ThumbnailLoader(QObject):
+    """
+    用几个后台线程加载缩略图。请求来自列表绘制，后请求的先处理；列表滚动时丢弃尚未开始的请求，
+    仍然可见的行重绘时会再次请求，滚动经过的行不会被渲染。
+    resolve_source(路径) 在后台线程中调用，返回用于渲染的文件，返回 None 时只查磁盘缓存。
+    """
+    thumbnail_ready = pyqtSignal(str)
+
+    def __init__(self, cache, resolve_source, workers=THUMBNAIL_WORKERS, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.resolve_source = resolve_source
+        self.requests = []
+        self.pending = set()
+        # 无法生成缩略图的材料，不再反复请求
+        self.unavailable = set()
+        self.stopping = False
+        self.condition = threading.Condition()
+        self.threads = [threading.Thread(target=self._run, name=f"thumbnail-{i}", daemon=True) for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def request(self, path):
+        with self.condition:
+            if path in self.pending or path in self.unavailable or self.stopping:
+                return
+            self.pending.add(path)
+            self.requests.append(path)
+            self.condition.notify()
+
+    def forget_requests(self):
+        with self.condition:
+            self.pending.difference_update(self.requests)
+            self.requests.clear()
+
+    def invalidate(self, path):
+        """材料被修改、删除或重命名后调用"""
+        self.cache.discard(path)
+        with self.condition:
+            self.unavailable.discard(path)
+
+    def retry_unavailable(self):
+        """生成后缓存中多了转换好的 Word 文档，此前没有缩略图的材料可以再试一次"""
+        with self.condition:
+            self.unavailable.clear()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.requests.clear()
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.requests and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                path = self.requests.pop()
+            try:
+                image = self.cache.load(path, self.resolve_source(path))
+            except Exception:
+                image = None
+            with self.condition:
+                self.pending.discard(path)
+                if image is None:
+                    self.unavailable.add(path)
+            if image is not None:
+                self.thumbnail_ready.emit(path)
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """在列表项左侧显示首页缩略图；只有实际绘制的（即可见的）行才会请求加载"""
+    def __init__(self, window, parent=None):
+        super().__init__(parent)
+        self.window = window
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        image = self.window.thumbnail_image(index.data(MATERIAL_PATH_ROLE))
+        option.features |= QStyleOptionViewItem.ViewItemFeature.HasDecoration
+        option.icon = QIcon(QPixmap.fromImage(image)) if image is not None else self.window.placeholder_icon
+        option.decorationSize = THUMBNAIL_SIZE
+
+    def paint(self, painter, option, index):
+        path = index.data(MATERIAL_PATH_ROLE)
+        if path and self.window.thumbnail_image(path) is None:
+            self.window.request_thumbnail(path)
+        super().paint(painter, option, index)
+
+
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
-        self.available_file_paths = {}
+        self.library = MaterialLibrary()
+        self.material_roots = []
+        self.scan_workers = set()
+        self.conversion_cache = None
+        self.generate_worker = None
+        self.cover_template = None
+        self.thumbnail_loader = None
+
+        # 各材料的元数据（页数未知时为 None），由后台线程填充
+        self.material_info = {}
+        self.metadata_worker = None
+        self.updated_paths = set()
+        self.metadata_timer = QTimer(self)
+        self.metadata_timer.setSingleShot(True)
+        self.metadata_timer.setInterval(METADATA_REFRESH_DELAY)
+        self.metadata_timer.timeout.connect(self.refresh_item_texts)
+
+        self.folder_watcher = QFileSystemWatcher(self)
+        self.folder_watcher.directoryChanged.connect(self.on_directory_changed)
+        self.changed_directories = set()
+        self.folder_change_timer = QTimer(self)
+        self.folder_change_timer.setSingleShot(True)
+        self.folder_change_timer.setInterval(FOLDER_CHANGE_DELAY)
+        self.folder_change_timer.timeout.connect(self.apply_folder_changes)
         self.initUI()
+        QTimer.singleShot(WARM_UP_DELAY, self.start_warm_up)
+
+    def start_warm_up(self):
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
 
     def initUI(self):
         self.setWindowTitle('夏令营申请材料生成器 by 法国就是培根 (v3.2 - 稳定版)')
@@ -118,6 +361,7 @@ class MainWindow(QWidget):
             QLabel#titleLabel { font-size: 16px; font-weight: bold; color: #88C0D0; padding-bottom: 5px; }
             QLineEdit { background-color: #3B4252; border: 1px solid #4C566A; padding: 8px; border-radius: 5px; color: #ECEFF4; }
             QLineEdit:focus { border: 1px solid #88C0D0; }
+            QSpinBox { background-color: #3B4252; border: 1px solid #4C566A; padding: 6px; border-radius: 5px; color: #ECEFF4; }
             QListWidget { background-color: #3B4252; border: 1px solid #4C566A; border-radius: 5px; padding: 5px; }
             QListWidget::item { padding: 8px; }
             QListWidget::item:hover { background-color: #434C5E; }
@@ -152,6 +396,7 @@ class MainWindow(QWidget):
         left_layout = QVBoxLayout()
         available_label = QLabel('可用材料库 (可拖拽)')
         available_label.setObjectName("titleLabel")
+        self.available_label = available_label
         self.available_files_list = QListWidget()
         self.available_files_list.setDragEnabled(True)
         self.available_files_list.setSelectionMode(QListWidget.SelectionMode.ExtendedSelection)
@@ -161,6 +406,7 @@ class MainWindow(QWidget):
         right_layout = QVBoxLayout()
         final_label = QLabel('最终材料顺序 (可拖拽排序)')
         final_label.setObjectName("titleLabel")
+        self.final_label = final_label
         self.final_files_list = QListWidget()
         self.final_files_list.setAcceptDrops(True)
         self.final_files_list.setDragEnabled(True)
@@ -168,6 +414,13 @@ class MainWindow(QWidget):
         self.final_files_list.setSelectionMode(QListWidget.SelectionMode.ExtendedSelection)
         right_layout.addWidget(final_label)
         right_layout.addWidget(self.final_files_list)
+
+        self.placeholder_icon = self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon)
+        for list_widget in (self.available_files_list, self.final_files_list):
+            list_widget.setIconSize(THUMBNAIL_SIZE)
+            list_widget.setUniformItemSizes(True)
+            list_widget.setItemDelegate(ThumbnailDelegate(self, list_widget))
+            list_widget.verticalScrollBar().valueChanged.connect(self.forget_thumbnail_requests)
         
         core_layout.addLayout(left_layout, stretch=1)
         core_layout.addLayout(right_layout, stretch=1)
@@ -177,17 +430,30 @@ class MainWindow(QWidget):
         self.load_button = QPushButton('添加材料文件夹')
         self.about_button = QPushButton('关于 & 支持') # 新增按钮
         self.generate_button = QPushButton('一键生成PDF')
+        self.cancel_button = QPushButton('取消生成')
+        self.cancel_button.setVisible(False)
+        # 申请系统限制上传大小时，超出上限自动降低图片的分辨率和质量；0 表示不限
+        self.max_size_input = QSpinBox()
+        self.max_size_input.setRange(0, 1000)
+        self.max_size_input.setSuffix(' MB')
+        self.max_size_input.setSpecialValueText('不限大小')
+        self.max_size_input.setToolTip('输出文件大小上限，超出时自动降低各图片的分辨率和 JPEG 质量')
         
         icon_folder = self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon)
         icon_generate = self.style().standardIcon(QStyle.StandardPixmap.SP_DialogSaveButton)
         icon_about = self.style().standardIcon(QStyle.StandardPixmap.SP_DialogHelpButton)
+        icon_cancel = self.style().standardIcon(QStyle.StandardPixmap.SP_DialogCancelButton)
         self.load_button.setIcon(icon_folder)
         self.generate_button.setIcon(icon_generate)
         self.about_button.setIcon(icon_about) # 为新按钮设置图标
+        self.cancel_button.setIcon(icon_cancel)
 
         bottom_layout.addWidget(self.load_button)
         bottom_layout.addStretch() # 使用伸缩项将按钮分开
         bottom_layout.addWidget(self.about_button) # 添加新按钮到布局
+        bottom_layout.addWidget(QLabel('大小上限:'))
+        bottom_layout.addWidget(self.max_size_input)
+        bottom_layout.addWidget(self.cancel_button)
         bottom_layout.addWidget(self.generate_button)
         # --- 布局修改结束 ---
 
@@ -203,6 +469,7 @@ class MainWindow(QWidget):
         # --- 连接按钮信号 ---
         self.load_button.clicked.connect(self.load_materials_folder)
         self.generate_button.clicked.connect(self.generate_final_pdf)
+        self.cancel_button.clicked.connect(self.cancel_generation)
         self.about_button.clicked.connect(self.show_about_dialog) # 连接新按钮的点击信号
         # --- 信号连接结束 ---
 
@@ -210,6 +477,8 @@ class MainWindow(QWidget):
         self.final_files_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.available_files_list.customContextMenuRequested.connect(self.show_context_menu)
         self.final_files_list.customContextMenuRequested.connect(self.show_context_menu)
+        self.final_files_list.model().rowsInserted.connect(self.update_total_label)
+        self.final_files_list.model().rowsRemoved.connect(self.update_total_label)
 
         self.show()
 
@@ -246,7 +515,7 @@ class MainWindow(QWidget):
     def preview_file(self, item):
         """用系统默认程序打开并预览文件"""
         file_name = item.text()
-        file_path = self.available_file_paths.get(file_name)
+        file_path = item.data(MATERIAL_PATH_ROLE)
         if not file_path or not os.path.exists(file_path):
             QMessageBox.warning(self, "错误", f"文件 '{file_name}' 不存在或路径无效。")
             return
@@ -258,7 +527,7 @@ class MainWindow(QWidget):
     def open_in_folder(self, item):
         """在文件浏览器中打开文件所在的文件夹并选中该文件"""
         file_name = item.text()
-        file_path = self.available_file_paths.get(file_name)
+        file_path = item.data(MATERIAL_PATH_ROLE)
         if not file_path or not os.path.exists(file_path):
             QMessageBox.warning(self, "错误", f"文件 '{file_name}' 不存在或路径无效。")
             return
@@ -267,13 +536,13 @@ class MainWindow(QWidget):
 
     def rename_file(self, item):
         """重命名文件，并同步更新程序内的所有引用"""
-        old_name_with_ext = item.text()
-        old_full_path = self.available_file_paths.get(old_name_with_ext)
+        old_full_path = item.data(MATERIAL_PATH_ROLE)
 
         if not old_full_path:
             QMessageBox.critical(self, "错误", "找不到文件的内部记录。")
             return
 
+        old_name_with_ext = os.path.basename(old_full_path)
         old_name_no_ext, ext = os.path.splitext(old_name_with_ext)
         
         new_name_no_ext, ok = QInputDialog.getText(self, '重命名文件', '请输入新的文件名 (不含扩展名):', QLineEdit.EchoMode.Normal, old_name_no_ext)
@@ -298,69 +567,229 @@ class MainWindow(QWidget):
                 QMessageBox.critical(self, "错误", f"无法在磁盘上重命名文件：\n{e}")
                 return
             
-            self.available_file_paths.pop(old_name_with_ext)
-            self.available_file_paths[new_name_with_ext] = new_full_path
-            
-            item.setText(new_name_with_ext)
-            
-            source_list = self.sender()
-            other_list = self.final_files_list if source_list == self.available_files_list else self.available_files_list
-            
-            for i in range(other_list.count()):
-                if other_list.item(i).text() == old_name_with_ext:
-                    other_list.item(i).setText(new_name_with_ext)
-                    break
+            self.library.rename(old_full_path, new_full_path)
+            self.rename_items(old_full_path, new_full_path)
             
             QMessageBox.information(self, "成功", f"文件已重命名为 '{new_name_with_ext}'")
 
     def load_materials_folder(self):
         folder_path = QFileDialog.getExistingDirectory(self, '请选择您的材料所在的文件夹')
         if folder_path:
-            supported_extensions = ['.pdf', '.docx', '.doc', '.jpg', '.jpeg', '.png']
-            for file_name in os.listdir(folder_path):
-                if file_name not in self.available_file_paths:
-                    if any(file_name.lower().endswith(ext) for ext in supported_extensions):
-                        self.available_files_list.addItem(file_name)
-                        full_path = os.path.join(folder_path, file_name)
-                        self.available_file_paths[file_name] = full_path
-
-    def convert_image_to_pdf(self, img_path, pdf_path):
-        try:
-            c = canvas.Canvas(pdf_path, pagesize=A4)
-            A4_WIDTH, A4_HEIGHT = A4
-            
-            with Image.open(img_path) as img:
-                img_width, img_height = img.size
-                max_width = A4_WIDTH - 1 * inch
-                max_height = A4_HEIGHT - 1 * inch
-                ratio = min(max_width / img_width, max_height / img_height)
-                new_width = img_width * ratio
-                new_height = img_height * ratio
-                x_centered = (A4_WIDTH - new_width) / 2
-                y_centered = (A4_HEIGHT - new_height) / 2
-                c.drawImage(img_path, x_centered, y_centered, width=new_width, height=new_height, preserveAspectRatio=True)
-                
-            c.save()
-            return True
-        except Exception as e:
-            raise Exception(f"转换图片失败 {os.path.basename(img_path)}: {e}")
-
-    def convert_word_to_pdf(self, word_path, pdf_path):
-        word = None
-        doc = None
-        try:
-            word_path = os.path.abspath(word_path)
-            pdf_path = os.path.abspath(pdf_path)
-            word = win32com.client.Dispatch("Word.Application")
-            word.Visible = False
-            doc = word.Documents.Open(word_path)
-            doc.SaveAs(pdf_path, FileFormat=17)
-            return True
-        except Exception as e:
-            raise Exception(f"转换Word失败 {os.path.basename(word_path)}: {e}")
-        finally:
-            if doc: doc.Close(False)
-            if word: word.Quit()
+            folder_path = os.path.normpath(os.path.abspath(folder_path))
+            if self.library.covers(folder_path):
+                return
+            self.material_roots.append(folder_path)
+            self.start_scan([folder_path])
+
+    def start_scan(self, directories):
+        """在后台扫描目录（含子目录），结果分批加入可用材料库"""
+        worker = ScanWorker(directories, self)
+        worker.batch_found.connect(self.on_scan_batch)
+        worker.finished.connect(lambda: self.on_scan_finished(worker))
+        self.scan_workers.add(worker)
+        self.update_library_label()
+        worker.start()
+
+    def on_scan_batch(self, directories, files):
+        new_paths = self.library.add(directories, files)
+        if directories:
+            self.folder_watcher.addPaths(directories)
+        self.available_files_list.setUpdatesEnabled(False)
+        for path in new_paths:
+            self.available_files_list.addItem(self.make_material_item(path))
+        self.available_files_list.setUpdatesEnabled(True)
+        self.update_library_label()
+        self.request_metadata(new_paths)
+
+    def on_scan_finished(self, worker):
+        self.scan_workers.discard(worker)
+        worker.deleteLater()
+        self.update_library_label()
+
+    def update_library_label(self):
+        if self.scan_workers:
+            self.available_label.setText(f'可用材料库 (正在扫描... 已找到 {len(self.library.files)} 个)')
+        else:
+            self.available_label.setText('可用材料库 (可拖拽)')
+
+    def display_name(self, path):
+        """显示相对于所属材料文件夹的路径，不同子文件夹中的同名文件可以区分开"""
+        for root in self.material_roots:
+            if path.startswith(root + os.sep):
+                return os.path.relpath(path, root)
+        return os.path.basename(path)
+
+    def make_material_item(self, path):
+        item = QListWidgetItem()
+        self.set_item_path(item, path)
+        return item
+
+    def set_item_path(self, item, path):
+        item.setData(MATERIAL_PATH_ROLE, path)
+        self.set_item_text(item)
+
+    def set_item_text(self, item):
+        """列表中显示页数，提示中显示完整路径和文件大小"""
+        path = item.data(MATERIAL_PATH_ROLE)
+        info = self.material_info.get(path)
+        text, tooltip = self.display_name(path), path
+        if info is not None:
+            text += f"  · {info['pages']}页"
+            if info.get('size'):
+                tooltip += f"\n{info['pages']} 页，{info['size'] / 1024:.0f} KB"
+        item.setText(text)
+        item.setToolTip(tooltip)
+
+    def get_metadata_index(self):
+        """首次需要时再创建元数据索引和后台读取线程；缓存目录不可用时不显示页数"""
+        if self.metadata_worker is None:
+            try:
+                metadata = MetadataIndex()
+            except OSError as e:
+                print(f"元数据索引不可用: {e}")
+                return None
+            self.metadata_worker = MetadataWorker(metadata, self)
+            self.metadata_worker.metadata_ready.connect(self.on_metadata_ready)
+            self.metadata_worker.start()
+        return self.metadata_worker.metadata
+
+    def request_metadata(self, paths):
+        if paths and self.get_metadata_index() is not None:
+            self.metadata_worker.request(paths)
+
+    def on_metadata_ready(self, path, info):
+        if path not in self.library:
+            return
+        self.material_info[path] = info
+        self.updated_paths.add(path)
+        if not self.metadata_timer.isActive():
+            self.metadata_timer.start()
+
+    def refresh_item_texts(self):
+        """把这段时间内读到的页数一次性刷新到列表中"""
+        paths, self.updated_paths = self.updated_paths, set()
+        items = self.items_by_path()
+        for path in paths:
+            for item in items.get(path, []):
+                self.set_item_text(item)
+        self.update_total_label()
+
+    def get_thumbnail_loader(self):
+        """首次绘制列表项时再创建缩略图缓存和后台线程；Word 文档的缩略图需要转换缓存"""
+        if self.thumbnail_loader is None:
+            self.get_conversion_cache()
+            self.thumbnail_loader = ThumbnailLoader(ThumbnailCache(), self.thumbnail_source, parent=self)
+            self.thumbnail_loader.thumbnail_ready.connect(self.on_thumbnail_ready)
+        return self.thumbnail_loader
+
+    def thumbnail_image(self, path):
+        if self.thumbnail_loader is None or not path:
+            return None
+        return self.thumbnail_loader.cache.get(path)
+
+    def request_thumbnail(self, path):
+        self.get_thumbnail_loader().request(path)
+
+    def forget_thumbnail_requests(self):
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.forget_requests()
+
+    def invalidate_thumbnail(self, path):
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.invalidate(path)
+
+    def thumbnail_source(self, path):
+        """在后台线程中调用：Word 文档用转换缓存中上次转换得到的 PDF 渲染，没有时返回 None"""
+        from engine import conversion_settings
+        kind, settings = conversion_settings(path, default_backend_name())
+        if kind != 'word':
+            return path
+        cache = self.conversion_cache
+        return cache.peek(path, settings) if cache is not None else None
+
+    def on_thumbnail_ready(self, path):
+        self.repaint_lists()
+
+    def repaint_lists(self):
+        for list_widget in (self.available_files_list, self.final_files_list):
+            list_widget.viewport().update()
+
+    def update_total_label(self):
+        """根据右侧列表中的材料实时估算成品总页数；有页数未知的材料时显示为下限"""
+        count = self.final_files_list.count()
+        if count == 0:
+            self.final_label.setText('最终材料顺序 (可拖拽排序)')
+            return
+        total, unknown = 0, False
+        for i in range(count):
+            info = self.material_info.get(self.final_files_list.item(i).data(MATERIAL_PATH_ROLE))
+            if info is None:
+                unknown = True
+            else:
+                total += info['pages']
+        prefix = '≥' if unknown else ''
+        if self.cover_template is not None:
+            total += self.cover_template.page_count(count)
+            self.final_label.setText(f'最终材料顺序 (预计共 {prefix}{total} 页)')
+        else:
+            self.final_label.setText(f'最终材料顺序 (材料共 {prefix}{total} 页，不含封面目录)')
+
+    def items_by_path(self):
+        """返回 {路径: [两个列表中对应的项目]}"""
+        items = {}
+        for list_widget in (self.available_files_list, self.final_files_list):
+            for i in range(list_widget.count()):
+                item = list_widget.item(i)
+                items.setdefault(item.data(MATERIAL_PATH_ROLE), []).append(item)
+        return items
+
+    def rename_items(self, old_path, new_path):
+        self.material_info[new_path] = self.material_info.pop(old_path, None)
+        self.invalidate_thumbnail(old_path)
+        for item in self.items_by_path().get(old_path, []):
+            self.set_item_path(item, new_path)
+        # 指纹包含路径，重命名后按新路径重新登记元数据
+        self.request_metadata([new_path])
+
+    def on_directory_changed(self, path):
+        """监视器报告目录变化；短时间内的多次变化合并后统一处理"""
+        self.changed_directories.add(os.path.normpath(path))
+        self.folder_change_timer.start()
+
+    def apply_folder_changes(self):
+        """只重新列出发生变化的目录，增量地更新两个列表"""
+        directories, self.changed_directories = self.changed_directories, set()
+        changes = self.library.refresh(directories)
+
+        items = self.items_by_path()
+        for path in changes['removed']:
+            self.material_info.pop(path, None)
+            self.invalidate_thumbnail(path)
+            for item in items.get(path, []):
+                list_widget = item.listWidget()
+                list_widget.takeItem(list_widget.row(item))
+        for old_path, new_path in changes['renamed']:
+            self.material_info[new_path] = self.material_info.pop(old_path, None)
+            self.invalidate_thumbnail(old_path)
+            for item in items.get(old_path, []):
+                self.set_item_path(item, new_path)
+        for path in changes['added']:
+            self.available_files_list.addItem(self.make_material_item(path))
+        # 文件内容变化后旧的页数作废，在重新读到之前显示为未知
+        for path in changes['modified']:
+            self.material_info.pop(path, None)
+            self.invalidate_thumbnail(path)
+            for item in items.get(path, []):
+                self.set_item_text(item)
+        self.update_total_label()
+        self.request_metadata(changes['added'] + changes['modified'] + [new for _, new in changes['renamed']])
+
+        watched = set(self.folder_watcher.directories())
+        gone = [d for d in changes['removed_directories'] if d in watched]
+        if gone:
+            self.folder_watcher.removePaths(gone)
+        if changes['new_directories']:
+            self.start_scan(changes['new_directories'])
 
     def generate_final_pdf(self):
         school_name = self.school_name_input.text().strip()
@@ -382,127 +811,97 @@ class MainWindow(QWidget):
         if not save_path:
             return
 
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setValue(0)
-        QApplication.processEvents()
+        from engine import PacketBuilder, default_workers
         temp_dir = os.path.join(os.path.dirname(save_path), "temp_conversion")
+        profile_mode = os.environ.get(PROFILE_ENV)
+        builder = PacketBuilder(template_path, temp_dir, cache=self.get_conversion_cache(), workers=default_workers(),
+                                metadata=self.get_metadata_index(),
+                                profile=BuildProfile(trace_memory=profile_mode == PROFILE_MEMORY) if profile_mode else None)
+        material_paths = [self.final_files_list.item(i).data(MATERIAL_PATH_ROLE) for i in range(self.final_files_list.count())]
+
+        max_bytes = self.max_size_input.value() * 1024 * 1024 or None
+        self.generate_worker = GenerateWorker(builder, material_paths, school_name, save_path, max_bytes, self)
+        self.generate_worker.progress.connect(self.update_progress)
+        self.generate_worker.succeeded.connect(self.on_generate_succeeded)
+        self.generate_worker.failed.connect(self.on_generate_failed)
+        self.generate_worker.cancelled.connect(self.on_generate_cancelled)
+        self.generate_worker.finished.connect(self.on_generate_finished)
 
-        try:
-            if os.path.exists(temp_dir): shutil.rmtree(temp_dir)
-            os.makedirs(temp_dir)
-            
-            total_steps = len(final_items) + 4
-            current_step = 0
-            
-            converted_pdf_paths = []
-            for item_name in final_items:
-                current_step += 1
-                self.progress_bar.setFormat(f"正在处理: {item_name}")
-                self.progress_bar.setValue(int(current_step / total_steps * 100))
-                QApplication.processEvents()
-                original_path = self.available_file_paths[item_name]
-                file_ext = os.path.splitext(item_name)[1].lower()
-                temp_pdf_path = os.path.join(temp_dir, f"{current_step}_{os.path.basename(item_name)}.pdf")
-
-                if file_ext == '.pdf':
-                    shutil.copy(original_path, temp_pdf_path)
-                    converted_pdf_paths.append(temp_pdf_path)
-                elif file_ext in ['.jpg', '.jpeg', '.png']:
-                    self.convert_image_to_pdf(original_path, temp_pdf_path)
-                    converted_pdf_paths.append(temp_pdf_path)
-                elif file_ext in ['.doc', '.docx']:
-                    self.convert_word_to_pdf(original_path, temp_pdf_path)
-                    converted_pdf_paths.append(temp_pdf_path)
-
-            current_step += 1
-            self.progress_bar.setFormat("合并内容并统一页面方向...")
-            self.progress_bar.setValue(int(current_step / total_steps * 100))
-            QApplication.processEvents()
-            
-            content_merger = PdfWriter()
-            toc_entries = []
-            toc_page_count = 1
-            current_page_in_content = 1
-            
-            for i, path in enumerate(converted_pdf_paths):
-                try:
-                    reader = PdfReader(path)
-                    num_pages_in_file = len(reader.pages)
-                    toc_entries.append({'title': os.path.splitext(final_items[i])[0], 'page': current_page_in_content + toc_page_count})
-                    for page in reader.pages:
-                        if page.mediabox.width > page.mediabox.height:
-                            page.rotate(90)
-                        content_merger.add_page(page)
-                    current_page_in_content += num_pages_in_file
-                except Exception as file_error:
-                    raise Exception(f"处理文件 '{os.path.basename(path)}' 时发生错误，文件可能已损坏。") from file_error
-            
-            content_path = os.path.join(temp_dir, "content.pdf")
-            with open(content_path, "wb") as f_content:
-                content_merger.write(f_content)
-            
-            current_step += 1
-            self.progress_bar.setFormat("创建精美目录页...")
-            self.progress_bar.setValue(int(current_step / total_steps * 100))
-            QApplication.processEvents()
-            doc = Document(template_path)
-            for p in doc.paragraphs:
-                if '【目标院校名称】' in p.text:
-                    p.text = ""
-                    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    run = p.add_run(school_name)
-                    run.font.name = '黑体'
-                    run.font.size = Pt(26)
-                    break
-            for p in doc.paragraphs:
-                if '【目录】' in p.text:
-                    p.text = ""
-                    p.paragraph_format.tab_stops.add_tab_stop(Inches(6.0), WD_TAB_LEADER.DOTS, WD_ALIGN_PARAGRAPH.RIGHT)
-                    for entry in toc_entries:
-                        run = p.add_run(f"{entry['title']}\t{entry['page']}")
-                        font = run.font; font.name = '宋体'; font.size = Pt(12)
-                        p.add_run().add_break()
-                    break
-            temp_toc_docx_path = os.path.join(temp_dir, "toc_temp.docx")
-            doc.save(temp_toc_docx_path)
-            temp_toc_pdf_path = os.path.join(temp_dir, "toc_temp.pdf")
-            self.convert_word_to_pdf(temp_toc_docx_path, temp_toc_pdf_path)
-
-            current_step += 1
-            self.progress_bar.setFormat("最终合并并添加页码...")
-            self.progress_bar.setValue(int(current_step / total_steps * 100))
-            QApplication.processEvents()
-            
-            final_merger = PdfWriter()
-            final_merger.append(temp_toc_pdf_path)
-            final_merger.append(content_path)
-
-            for i, page in enumerate(final_merger.pages):
-                packet = io.BytesIO()
-                page_width = page.mediabox.width
-                page_height = page.mediabox.height
-                c = canvas.Canvas(packet, pagesize=(page_width, page_height))
-                c.setFont('Helvetica', 9)
-                page_number_text = str(i + 1)
-                c.drawCentredString(float(page_width) / 2, 0.5 * inch, page_number_text)
-                c.save()
-                packet.seek(0)
-                watermark_pdf = PdfReader(packet)
-                page.merge_page(watermark_pdf.pages[0])
-
-            with open(save_path, "wb") as f: final_merger.write(f)
-            self.progress_bar.setValue(100)
-            self.progress_bar.setFormat("完成!")
-            QMessageBox.information(self, '成功', f'文件已成功生成！\n保存在: {save_path}')
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("准备中...")
+        self.set_generating(True)
+        self.generate_worker.start()
+
+    def set_generating(self, generating):
+        """生成期间禁用会改变材料的操作，并显示取消按钮"""
+        self.generate_button.setEnabled(not generating)
+        self.load_button.setEnabled(not generating)
+        self.max_size_input.setEnabled(not generating)
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.setVisible(generating)
+
+    def cancel_generation(self):
+        if self.generate_worker is not None:
+            self.cancel_button.setEnabled(False)
+            self.progress_bar.setFormat("正在取消...")
+            self.generate_worker.cancel()
+
+    def on_generate_succeeded(self, save_path):
+        # 记下封面模板以便估算封面目录页数；生成时转换过的 Word 文档此时也能查到页数了
+        self.cover_template = self.generate_worker.builder.cover
+        self.request_metadata([path for path in self.library.files if self.material_info.get(path) is None])
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.retry_unavailable()
+            self.repaint_lists()
+        self.update_total_label()
+        self.progress_bar.setValue(100)
+        self.progress_bar.setFormat("完成!")
+        message = f'文件已成功生成！\n保存在: {save_path}'
+        if self.generate_worker.budget_report is not None:
+            message += '\n\n' + self.generate_worker.budget_report.summary()
+        QMessageBox.information(self, '成功', message)
+
+    def on_generate_failed(self, message):
+        QMessageBox.critical(self, '发生错误', f"生成过程中出现问题，操作已中断。\n\n错误信息:\n{message}")
+
+    def on_generate_cancelled(self):
+        QMessageBox.information(self, '已取消', '生成已取消。')
+
+    def on_generate_finished(self):
+        self.progress_bar.setVisible(False)
+        self.set_generating(False)
+        self.generate_worker.deleteLater()
+        self.generate_worker = None
+
+    def closeEvent(self, event):
+        """关闭窗口时取消正在进行的生成和扫描，并等待后台线程清理临时文件"""
+        if self.generate_worker is not None:
+            self.generate_worker.cancel()
+            self.generate_worker.wait()
+        for worker in list(self.scan_workers):
+            worker.requestInterruption()
+            worker.wait()
+        if self.metadata_worker is not None:
+            self.metadata_worker.stop()
+            self.metadata_worker.wait()
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.stop()
+        super().closeEvent(event)
+
+    def get_conversion_cache(self):
+        """首次生成时再创建转换缓存；缓存目录不可用时退回到不缓存"""
+        if self.conversion_cache is None:
+            try:
+                self.conversion_cache = ConversionCache()
+            except OSError as e:
+                print(f"转换缓存不可用: {e}")
+        return self.conversion_cache
 
-        except Exception as e:
-            traceback.print_exc() 
-            QMessageBox.critical(self, '发生错误', f"生成过程中出现问题，操作已中断。\n\n错误信息:\n{e}")
-        
-        finally:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-            self.progress_bar.setVisible(False)
+    def update_progress(self, percent, message):
+        """接收后台线程的进度信号并刷新进度条"""
+        self.progress_bar.setFormat(message)
+        self.progress_bar.setValue(percent)
 
 if __name__ == '__main__':
     # 确保在高DPI屏幕上显示正常
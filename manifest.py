@@ -0,0 +1,150 @@
+"""
+增量生成所用的构建清单。
+
+每次生成材料包后写入一份清单（保存在应用缓存目录下，不在输出文件旁边留下用户可能误传的文件），记录院校名称、封面模板、各材料的输入指纹、
+顺序、页数、它们在输出文件中的页码范围以及每页页码内容流的对象编号。下次为同一院校生成时，
+据此判断哪些材料可以直接沿用上次输出中的页面，只需重新渲染封面目录、追加有变化的材料，
+并替换页码发生变化的那些页码内容流。
+"""
+import os
+import json
+import hashlib
+
+from cache import app_cache_dir
+
+MANIFEST_VERSION = 1
+
+# 增量更新会在文件末尾追加新版本，旧对象仍留在文件中；连续增量更新超过这个次数后做一次完整生成以压缩体积
+MAX_REVISIONS = 5
+
+# 有变化的页数超过总页数的这个比例时，增量更新已不划算，直接完整生成
+MAX_CHANGED_RATIO = 0.5
+
+MANIFEST_DIRECTORY = 'manifests'
+
+
+def manifest_path(save_path):
+    """按输出文件解析后的绝对路径取哈希命名"""
+    key = os.path.normcase(os.path.realpath(save_path))
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(app_cache_dir(), MANIFEST_DIRECTORY, f"{digest}.json")
+
+
+def _legacy_manifest_path(save_path):
+    """旧版本写在输出文件旁边的清单"""
+    directory, name = os.path.split(os.path.abspath(save_path))
+    return os.path.join(directory, f".{name}.manifest.json")
+
+
+def file_state(path):
+    """返回文件的大小和修改时间，文件不存在时返回 None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def source_fingerprint(path, settings=None):
+    """输入文件的指纹：路径、大小、修改时间和转换参数都未变时认为转换结果不变"""
+    state = file_state(path)
+    if state is None:
+        return None
+    data = json.dumps([os.path.abspath(path), state, settings], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def load_manifest(save_path):
+    try:
+        with open(manifest_path(save_path), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(save_path, school_name, cover, segments, number_ids, revisions=0):
+    """在输出文件写好之后调用，记录本次生成的内容；number_ids 是按页序排列的页码内容流对象编号"""
+    cover_pages = cover.page_count(len(segments))
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'school_name': school_name,
+        'cover': cover.fingerprint,
+        'cover_pages': cover_pages,
+        'revisions': revisions,
+        'output': file_state(save_path),
+        'items': [],
+    }
+    for segment in segments:
+        output_start = cover_pages + segment['start'] - 1
+        manifest['items'].append({
+            'fingerprint': segment.get('fingerprint'),
+            'title': segment['title'],
+            'pages': segment['pages'],
+            'output_start': output_start,
+            'number_streams': number_ids[output_start:output_start + segment['pages']],
+        })
+    path = manifest_path(save_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    _remove(_legacy_manifest_path(save_path))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def remove_manifest(save_path):
+    _remove(manifest_path(save_path))
+    _remove(_legacy_manifest_path(save_path))
+
+
+def plan_incremental(manifest, school_name, cover, segments, save_path):
+    """
+    对比上次的清单，返回与 segments 一一对应的列表：可沿用的材料给出清单中对应的旧条目，
+    需要重新追加的材料为 None。无法或不值得增量更新时返回 None。
+    """
+    if manifest is None or cover.fingerprint is None:
+        return None
+    if manifest['school_name'] != school_name or manifest['cover'] != cover.fingerprint:
+        return None
+    if manifest['revisions'] >= MAX_REVISIONS or manifest['output'] != file_state(save_path):
+        return None
+
+    available = {}
+    for item in manifest['items']:
+        if item['fingerprint'] is not None:
+            available.setdefault(item['fingerprint'], []).append(item)
+
+    plan = []
+    changed_pages = 0
+    for segment in segments:
+        candidates = available.get(segment.get('fingerprint'))
+        item = candidates.pop(0) if candidates else None
+        if item is not None and item['pages'] == segment['pages']:
+            plan.append(item)
+        else:
+            plan.append(None)
+            changed_pages += segment['pages']
+    if changed_pages > MAX_CHANGED_RATIO * sum(segment['pages'] for segment in segments):
+        return None
+    return plan
+
+
+def is_up_to_date(manifest, plan, cover, segments):
+    """材料、顺序和标题都与上次相同时，输出文件无需任何改动"""
+    cover_pages = cover.page_count(len(segments))
+    if manifest['cover_pages'] != cover_pages or len(manifest['items']) != len(segments):
+        return False
+    for item, segment, old_item in zip(manifest['items'], segments, plan):
+        if old_item is not item or item['title'] != segment['title']:
+            return False
+    return True
@@ -0,0 +1,83 @@
+"""
+材料元数据索引：每个材料（转换后的 PDF）的页数、需要旋转的横向页和文件大小。
+
+索引按输入指纹（见 manifest.source_fingerprint）寻址，文件被修改后指纹随之改变，旧记录自然失效。
+界面在后台填充索引以显示页数和预计总页数；生成时直接查索引得到目录页码和旋转决定，
+不必再为统计页数逐个解析 PDF。
+"""
+import os
+import json
+import time
+import threading
+
+from cache import app_cache_path
+
+MAX_ENTRIES = 20000
+
+
+def pdf_metadata(reader, pdf_path):
+    """从已打开的 PdfReader 中读取元数据；横向页（宽大于高）合并时会旋转为纵向"""
+    landscape = [index for index, page in enumerate(reader.pages) if page.mediabox.width > page.mediabox.height]
+    return {'pages': len(reader.pages), 'landscape': landscape, 'size': os.path.getsize(pdf_path)}
+
+
+class MetadataIndex:
+    """线程安全的元数据索引，默认保存在应用缓存目录下的 metadata.json 中（与转换缓存并列）"""
+    FILE_NAME = 'metadata.json'
+
+    def __init__(self, cache_dir=None, max_entries=MAX_ENTRIES):
+        self.path = os.path.join(cache_dir, self.FILE_NAME) if cache_dir else app_cache_path(self.FILE_NAME)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._dirty = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self._entries = json.load(f).get('entries', {})
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get(self, fingerprint):
+        if fingerprint is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return None
+            entry['last_used'] = time.time()
+            self._dirty = True
+            return entry['metadata']
+
+    def put(self, fingerprint, metadata):
+        if fingerprint is None:
+            return
+        with self._lock:
+            self._entries[fingerprint] = {'metadata': metadata, 'last_used': time.time()}
+            self._dirty = True
+            if len(self._entries) > self.max_entries:
+                oldest = sorted(self._entries, key=lambda k: self._entries[k]['last_used'])
+                for key in oldest[:len(self._entries) - self.max_entries]:
+                    del self._entries[key]
+
+    def read(self, fingerprint, pdf_path):
+        """命中时直接返回，否则解析 PDF 并记入索引。返回 (元数据, 打开的 PdfReader 或 None)"""
+        metadata = self.get(fingerprint)
+        if metadata is not None:
+            return metadata, None
+        from pypdf import PdfReader
+        reader = PdfReader(pdf_path)
+        metadata = pdf_metadata(reader, pdf_path)
+        self.put(fingerprint, metadata)
+        return metadata, reader
+
+    def save(self):
+        """有改动时把索引原子地写回磁盘"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({'entries': self._entries}, ensure_ascii=False)
+            self._dirty = False
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
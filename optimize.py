@@ -0,0 +1,154 @@
+"""
+可选的输出优化，在完整生成的最后代替 PdfWriter.write 写出文件。
+
+1. 合并内容完全相同的对象：各材料分别嵌入的同一字体、印章或信头图片只保留一份；
+2. 压缩尚未压缩的流：页码、封面覆盖层等新建的内容流按需 Flate 压缩（压缩后反而更大的保持原样）；
+3. 把流以外的对象每 OBJECTS_PER_STREAM 个打包进一个压缩的对象流，交叉引用也改用压缩的交叉引用流。
+
+合并和压缩都在原编号上就地替换，不重新编号；页码内容流各不相同，不会被合并。
+优化后的文件不再做增量更新，因此不写构建清单，下次生成总是完整生成。
+"""
+import io
+import zlib
+import struct
+
+from pypdf.generic import ArrayObject, DecodedStreamObject, NameObject, NumberObject, StreamObject
+
+from incremental import PDF_HEADER, write_object
+
+OBJECTS_PER_STREAM = 100
+# 经典交叉引用表中每个对象占 20 字节
+XREF_ENTRY_SIZE = 20
+FILTER_ENTRY = b"/Filter /FlateDecode "
+
+
+def _serialized_size(obj):
+    buffer = io.BytesIO()
+    obj.write_to_stream(buffer)
+    return len(buffer.getvalue())
+
+
+def _format_size(size):
+    return f"{size / 1048576:.2f} MB" if size >= 1048576 else f"{size / 1024:.1f} KB"
+
+
+class OptimizationReport:
+    """各步骤节省的字节数，按普通写出方式下这些对象会占用的字节计算"""
+    def __init__(self):
+        self.merged_objects = 0
+        self.merged_bytes = 0
+        self.compressed_streams = 0
+        self.compressed_bytes = 0
+        self.packed_objects = 0
+        self.packed_bytes = 0
+        self.output_size = 0
+
+    @property
+    def bytes_saved(self):
+        return self.merged_bytes + self.compressed_bytes + self.packed_bytes
+
+    def summary(self):
+        return (f"输出优化: 文件 {_format_size(self.output_size)}，共节省 {_format_size(self.bytes_saved)}"
+                f"（合并重复对象 {self.merged_objects} 个 {_format_size(self.merged_bytes)}，"
+                f"压缩流 {self.compressed_streams} 个 {_format_size(self.compressed_bytes)}，"
+                f"对象流打包 {self.packed_objects} 个 {_format_size(self.packed_bytes)}）")
+
+
+def merge_identical_objects(writer, report):
+    """合并内容相同的对象，并移除因此不再被引用的对象"""
+    before = list(writer._objects)
+    writer.compress_identical_objects(remove_duplicates=True, remove_unreferenced=True)
+    for old, new in zip(before, writer._objects):
+        if old is not None and new is None:
+            report.merged_objects += 1
+            report.merged_bytes += _serialized_size(old) + XREF_ENTRY_SIZE
+
+
+def compress_streams(writer, report):
+    """就地压缩没有 /Filter 的流；压缩后节省不了字节的流保持原样"""
+    for index, obj in enumerate(writer._objects):
+        if not isinstance(obj, StreamObject) or '/Filter' in obj:
+            continue
+        data = obj.get_data()
+        compressed = zlib.compress(data)
+        saved = len(data) - len(compressed) - len(FILTER_ENTRY)
+        if saved <= 0:
+            continue
+        stream = obj.flate_encode()
+        stream.indirect_reference = obj.indirect_reference
+        writer._objects[index] = stream
+        report.compressed_streams += 1
+        report.compressed_bytes += saved
+
+
+def write_with_object_streams(writer, path, report):
+    """
+    流对象照常逐个写出，其余对象打包进对象流，最后写出压缩的交叉引用流。
+    交叉引用流每项为 (类型 1 字节, 偏移或对象流编号 4 字节, 代数或流内序号 2 字节)。
+    """
+    objects = [(index + 1, obj) for index, obj in enumerate(writer._objects) if obj is not None]
+    streams = [(idnum, obj) for idnum, obj in objects if isinstance(obj, StreamObject)]
+    packable = [(idnum, obj) for idnum, obj in objects if not isinstance(obj, StreamObject)]
+    entries = {0: (0, 0, 65535)}
+    next_id = len(writer._objects) + 1
+
+    with open(path, 'wb') as f:
+        f.write(PDF_HEADER)
+        for idnum, obj in streams:
+            entries[idnum] = (1, f.tell(), 0)
+            write_object(f, idnum, obj)
+
+        packed_start = f.tell()
+        classic_bytes = 0
+        for start in range(0, len(packable), OBJECTS_PER_STREAM):
+            chunk = packable[start:start + OBJECTS_PER_STREAM]
+            stream_id, next_id = next_id, next_id + 1
+            header, body = [], io.BytesIO()
+            for position, (idnum, obj) in enumerate(chunk):
+                entries[idnum] = (2, stream_id, position)
+                header.append(f"{idnum} {body.tell()}")
+                offset = body.tell()
+                obj.write_to_stream(body)
+                body.write(b"\n")
+                classic_bytes += len(f"{idnum} 0 obj\n\nendobj\n") + body.tell() - 1 - offset + XREF_ENTRY_SIZE
+            first = (' '.join(header) + '\n').encode('ascii')
+            object_stream = DecodedStreamObject()
+            object_stream.set_data(first + body.getvalue())
+            object_stream.update({
+                NameObject('/Type'): NameObject('/ObjStm'),
+                NameObject('/N'): NumberObject(len(chunk)),
+                NameObject('/First'): NumberObject(len(first)),
+            })
+            entries[stream_id] = (1, f.tell(), 0)
+            write_object(f, stream_id, object_stream.flate_encode())
+            report.packed_objects += len(chunk)
+
+        xref_id = next_id
+        xref_location = f.tell()
+        entries[xref_id] = (1, xref_location, 0)
+        size = xref_id + 1
+        rows = b''.join(struct.pack('>BIH', *entries.get(idnum, (0, 0, 0))) for idnum in range(size))
+        xref_stream = DecodedStreamObject()
+        xref_stream.set_data(rows)
+        xref_stream.update({
+            NameObject('/Type'): NameObject('/XRef'),
+            NameObject('/Size'): NumberObject(size),
+            NameObject('/W'): ArrayObject([NumberObject(1), NumberObject(4), NumberObject(2)]),
+            NameObject('/Root'): writer.root_object.indirect_reference,
+        })
+        if writer._info is not None:
+            xref_stream[NameObject('/Info')] = writer._info.indirect_reference
+        write_object(f, xref_id, xref_stream.flate_encode())
+        f.write(f"startxref\n{xref_location}\n%%EOF\n".encode())
+        # 普通写出时，这些对象逐个写出并在交叉引用表中各占一项
+        report.packed_bytes = classic_bytes + XREF_ENTRY_SIZE * len(streams) - (f.tell() - packed_start)
+        report.output_size = f.tell()
+
+
+def optimize_and_write(writer, path):
+    """依次合并、压缩并以对象流写出到 path，返回 OptimizationReport"""
+    report = OptimizationReport()
+    merge_identical_objects(writer, report)
+    compress_streams(writer, report)
+    write_with_object_streams(writer, path, report)
+    return report
@@ -0,0 +1,215 @@
+"""
+生成过程的分阶段计量。
+
+给 PacketBuilder 传入 BuildProfile 后，每个阶段和每个文件的转换都会记录一个区间：
+墙钟时间、CPU 时间、读写字节数和页数；阶段还记录结束时进程的 RSS 峰值（由操作系统统计，不影响计时），
+以及可选的阶段内新增内存峰值（tracemalloc，会拖慢生成，只在排查内存问题时开启）。
+结果可以打印成汇总表，也可以导出为 Chrome trace 文件，用 chrome://tracing 或 ui.perfetto.dev 打开。
+未传入时使用 NULL_PROFILE，各处的计量调用不做任何事。
+"""
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+STAGE = 'stage'
+FILE = 'file'
+
+
+def peak_rss():
+    """当前进程到目前为止的常驻内存峰值（字节）；无法获取时返回 None"""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.WinDLL('kernel32')
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi = ctypes.WinDLL('psapi')
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD]
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Span:
+    """一个计量区间；start 为 time.perf_counter() 的绝对值，同一台机器上的各进程可以直接比较"""
+    def __init__(self, name, category, args=None):
+        self.name = name
+        self.category = category
+        self.args = dict(args or {})
+        self.pid = os.getpid()
+        self.thread = threading.current_thread().name
+        self.start = 0.0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory = None
+        self.peak_rss = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.pages = 0
+
+
+def timed_call(func, *args, **kwargs):
+    """
+    在当前线程或子进程中执行 func，返回 (结果, 计量)；计量是可以跨进程传回的普通字典。
+    CPU 时间只统计执行 func 的线程。
+    """
+    start, start_cpu = time.perf_counter(), time.thread_time()
+    result = func(*args, **kwargs)
+    return result, {'start': start, 'wall': time.perf_counter() - start, 'cpu': time.thread_time() - start_cpu,
+                    'pid': os.getpid(), 'thread': threading.current_thread().name}
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class BuildProfile:
+    """
+    线程安全地收集计量区间。阶段按顺序在同一线程中执行，记录整个进程的 CPU 时间和阶段结束时进程的 RSS 峰值；
+    文件转换可能并行执行，只记录执行线程自身的 CPU 时间。
+    trace_memory 为 True 时在 start() 中开启 tracemalloc，额外记录阶段内新增内存的峰值；
+    它会明显拖慢生成，此时的耗时不能代表正常生成，只在排查内存问题时使用。
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.spans = []
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def stage(self, name, **args):
+        """计量一个阶段；调用方可以在区间内设置 span.pages、span.bytes_read 和 span.bytes_written"""
+        span = Span(name, STAGE, args)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        span.start, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield span
+        finally:
+            span.wall = time.perf_counter() - span.start
+            span.cpu = time.process_time() - start_cpu
+            if tracing:
+                span.peak_memory = max(0, tracemalloc.get_traced_memory()[1] - base)
+            span.peak_rss = peak_rss()
+            self._add(span)
+
+    def add_file(self, name, measurement, **fields):
+        """登记一个由 timed_call 计量的文件处理；fields 可以是 pages、bytes_read、bytes_written 或其他参数"""
+        span = Span(name, FILE)
+        for key in ('start', 'wall', 'cpu', 'pid', 'thread'):
+            setattr(span, key, measurement[key])
+        for key, value in fields.items():
+            if hasattr(span, key) and key not in ('name', 'category', 'args'):
+                setattr(span, key, value)
+            else:
+                span.args[key] = value
+        self._add(span)
+        return span
+
+    def stages(self):
+        return [span for span in self.spans if span.category == STAGE]
+
+    def files(self):
+        return [span for span in self.spans if span.category == FILE]
+
+    def summary_table(self, top_files=10):
+        """各阶段的计量，以及耗时最长的若干个文件"""
+        lines = [f"{'阶段':<18} {'墙钟(s)':>9} {'CPU(s)':>9} {'RSS峰值(MB)':>12} {'新增内存峰值(MB)':>16} "
+                 f"{'读(MB)':>9} {'写(MB)':>9} {'页数':>6}"]
+        for span in self.stages():
+            label = span.name + (f" [{span.args['school']}]" if 'school' in span.args else '')
+            rss = f"{span.peak_rss / 1048576:.1f}" if span.peak_rss is not None else '-'
+            memory = f"{span.peak_memory / 1048576:.1f}" if span.peak_memory is not None else '-'
+            lines.append(f"{label:<18} {span.wall:>9.3f} {span.cpu:>9.3f} {rss:>12} {memory:>16} "
+                         f"{span.bytes_read / 1048576:>9.2f} {span.bytes_written / 1048576:>9.2f} {span.pages:>6}")
+        files = sorted(self.files(), key=lambda span: span.wall, reverse=True)[:top_files]
+        if files:
+            lines.append('')
+            lines.append(f"{'文件':<30} {'墙钟(s)':>9} {'CPU(s)':>9} {'读(MB)':>9} {'写(MB)':>9} {'页数':>6}  备注")
+            for span in files:
+                note = ', '.join(f"{key}={value}" for key, value in span.args.items())
+                lines.append(f"{span.name:<30} {span.wall:>9.3f} {span.cpu:>9.3f} {span.bytes_read / 1048576:>9.2f} "
+                             f"{span.bytes_written / 1048576:>9.2f} {span.pages:>6}  {note}")
+        return '\n'.join(lines)
+
+    def trace_events(self):
+        """转换为 Chrome trace 格式的完整事件（ph='X'），时间单位为微秒"""
+        events = []
+        threads = {}
+        for span in sorted(self.spans, key=lambda span: span.start):
+            tid = threads.setdefault((span.pid, span.thread), len(threads) + 1)
+            args = dict(span.args, cpu_ms=round(span.cpu * 1000, 3), bytes_read=span.bytes_read,
+                        bytes_written=span.bytes_written, pages=span.pages)
+            if span.peak_memory is not None:
+                args['peak_memory'] = span.peak_memory
+            if span.peak_rss is not None:
+                args['peak_rss'] = span.peak_rss
+            events.append({'name': span.name, 'cat': span.category, 'ph': 'X', 'pid': span.pid, 'tid': tid,
+                           'ts': round((span.start - self.origin) * 1e6, 1), 'dur': round(span.wall * 1e6, 1),
+                           'args': args})
+        for (pid, thread), tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread}})
+        return events
+
+    def export_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+
+class NullProfile:
+    """不做任何记录的占位实现，接口与 BuildProfile 相同"""
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @contextmanager
+    def stage(self, name, **args):
+        yield Span(name, STAGE)
+
+    def add_file(self, name, measurement, **fields):
+        return None
+
+
+NULL_PROFILE = NullProfile()
@@ -0,0 +1,116 @@
+"""
+页码盖印。
+
+页码文字直接追加到每页的内容流中，不再为每一页单独生成 reportlab 画布、
+解析成 PDF 再 merge_page。字体资源和用于保存图形状态的流在整个文档中只创建一份。
+"""
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject, NameObject
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.lib.units import inch
+
+FONT_RESOURCE_NAME = '/SCMGPageNumber'
+
+# 把“显示坐标”（页面按 /Rotate 旋转后看到的坐标）映射回页面用户空间的矩阵，
+# 让页码在旋转过的页面上同样出现在视觉上的底部居中并保持正向
+_ROTATION_MATRICES = {
+    0: lambda u, v, w, h: (1, 0, 0, 1, u, v),
+    90: lambda u, v, w, h: (0, 1, -1, 0, w - v, u),
+    180: lambda u, v, w, h: (-1, 0, 0, -1, w - u, h - v),
+    270: lambda u, v, w, h: (0, -1, 1, 0, v, h - u),
+}
+
+
+def add_stream(writer, data):
+    """把 data 作为新的内容流对象加入写入器，返回其引用"""
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+
+def wrap_contents(writer, page, before, after):
+    """
+    把页面原有的内容流放进一个数组，前面接 before、后面接 after（内容流引用的列表）。
+    原有内容不解析也不重新编码；直接内嵌在页面中的内容流先加入写入器。
+    """
+    streams = ArrayObject(before)
+    contents = page.get('/Contents')
+    if contents is not None:
+        resolved = contents.get_object()
+        if isinstance(resolved, ArrayObject):
+            streams.extend(resolved)
+        elif isinstance(contents, IndirectObject):
+            streams.append(contents)
+        else:
+            streams.append(writer._add_object(contents))
+    streams.extend(after)
+    page[NameObject('/Contents')] = streams
+
+
+class PageNumberStamper:
+    """在写入器的页面底部居中写入页码，整个文档只遍历一次"""
+    def __init__(self, writer, font='Helvetica', font_size=9, margin=0.5 * inch):
+        self.writer = writer
+        self.font = font
+        self.font_size = font_size
+        self.margin = margin
+        font_dict = DictionaryObject({
+            NameObject('/Type'): NameObject('/Font'),
+            NameObject('/Subtype'): NameObject('/Type1'),
+            NameObject('/BaseFont'): NameObject(f'/{font}'),
+            NameObject('/Encoding'): NameObject('/WinAnsiEncoding'),
+        })
+        self.font_ref = writer._add_object(font_dict)
+        # 原有内容流可能改变图形状态却不恢复，先用 q 保存，写页码前用 Q 恢复
+        self.save_state_ref = add_stream(writer, b"q\n")
+
+    def _register_font(self, page):
+        resources = page.get('/Resources')
+        if resources is None:
+            resources = DictionaryObject()
+            page[NameObject('/Resources')] = resources
+        else:
+            resources = resources.get_object()
+        fonts = resources.get('/Font')
+        if fonts is None:
+            fonts = DictionaryObject()
+            resources[NameObject('/Font')] = fonts
+        else:
+            fonts = fonts.get_object()
+        fonts[NameObject(FONT_RESOURCE_NAME)] = self.font_ref
+
+    def position_stream(self, page):
+        """把坐标原点移到页面视觉上的底部中点，页码本身写在下一个内容流中"""
+        box = page.mediabox
+        width, height = float(box.width), float(box.height)
+        rotation = page.rotation % 360
+        display_width = height if rotation in (90, 270) else width
+        a, b, c, d, e, f = _ROTATION_MATRICES[rotation](display_width / 2, self.margin, width, height)
+        e += float(box.left)
+        f += float(box.bottom)
+        return f"Q q {a} {b} {c} {d} {e:.3f} {f:.3f} cm\n".encode('ascii')
+
+    def number_stream(self, number):
+        """
+        写入页码文字的内容流数据，与页面几何无关。
+        页码单独占一个流对象，页码变化时只需替换这个对象，不必读取或修改页面本身。
+        """
+        text = str(number)
+        offset = stringWidth(text, self.font, self.font_size) / 2
+        return (f"BT {FONT_RESOURCE_NAME} {self.font_size} Tf {-offset:.3f} 0 Td ({text}) Tj ET Q\n").encode('ascii')
+
+    def stamp(self, page, number):
+        """为页面盖上页码，返回页码内容流的引用"""
+        self._register_font(page)
+        number_ref = add_stream(self.writer, self.number_stream(number))
+        position_ref = add_stream(self.writer, self.position_stream(page))
+        wrap_contents(self.writer, page, [self.save_state_ref], [position_ref, number_ref])
+        return number_ref
+
+    def stamp_all(self, on_page=None, start=1):
+        """为所有页面盖上页码，返回按页序排列的页码内容流引用"""
+        number_refs = []
+        for i, page in enumerate(self.writer.pages):
+            number_refs.append(self.stamp(page, start + i))
+            if on_page:
+                on_page()
+        return number_refs
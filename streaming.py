@@ -0,0 +1,180 @@
+"""
+内存有界的流式写出。
+
+完整生成时所有页面都先克隆进同一个 PdfWriter，最后一次写出；这里改为按块处理：
+每块页面克隆进一个新的 PdfWriter，盖好页码后立即把这块新建的对象序列化到输出文件，随后整块丢弃。
+各块写入器的对象编号从上一块用到的编号之后开始（前面用 None 占位），所有编号在整个文件中唯一；
+目录、页面树根和文档信息由 base 写入器提供，编号与每块写入器自带的这几个对象相同，最后才写出。
+峰值内存因此只取决于块的大小，与总页数无关（只有交叉引用表每个对象占几十字节）。
+
+代价是同一份材料中被多页共用的字体、图片等在不同的块中会各写出一份，输出文件略大。
+
+一块新建的对象也可以先序列化为 SerializedChunk，并记下其中每个对象引用的位置；
+之后按块的顺序把编号平移到实际位置后写出，结果与直接写出这一块逐字节相同，同一块也可以写进多个文件。
+
+这里和 incremental、optimize 模块用到了 pypdf 的内部属性（_objects、_info、_id_translated 等），
+README 中固定了经过测试的 pypdf 版本范围；升级 pypdf 后请运行 benchmarks/check_pypdf_internals.py。
+"""
+import io
+import os
+import re
+
+from pypdf import PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+from incremental import PDF_HEADER, write_object, write_xref_table
+
+# IndirectObject.write_to_stream 一次写出的引用，如 b"12 0 R"
+_REFERENCE = re.compile(rb"(\d+) (\d+) R")
+
+
+class _ReferenceRecorder(io.BytesIO):
+    """记下每次整段写入的对象引用中编号的 (位置, 长度, 编号)；其他对象不会单独写出这种形式的数据"""
+    def __init__(self):
+        super().__init__()
+        self.references = []
+
+    def write(self, data):
+        match = _REFERENCE.fullmatch(data)
+        if match:
+            self.references.append((self.tell(), len(match.group(1)), int(match.group(1))))
+        return super().write(data)
+
+
+_reference_recording_checked = False
+
+
+def check_reference_recording():
+    """确认当前 pypdf 仍然一次写出整个对象引用；不再如此时各块的编号无法平移，直接报错而不是写出损坏的文件"""
+    global _reference_recording_checked
+    if _reference_recording_checked:
+        return
+    buffer = _ReferenceRecorder()
+    ArrayObject([IndirectObject(12, 0, None), NumberObject(3), IndirectObject(4, 0, None)]).write_to_stream(buffer)
+    data = buffer.getvalue()
+    found = [(idnum, data[position:position + length]) for position, length, idnum in buffer.references]
+    if found != [(12, b'12'), (4, b'4')]:
+        raise Exception(f"当前 pypdf 版本写出对象引用的方式与预期不符（{data!r}），无法平移已序列化的对象。")
+    _reference_recording_checked = True
+
+
+class SerializedChunk:
+    """
+    一块已序列化的对象，可在进程间传递。objects 为 [(编号, 序列化数据, 引用位置)]，
+    编号从 first_id 起；page_ids、number_ids 为这块的页面和页码内容流编号，next_id 为这块之后的第一个编号。
+    """
+    def __init__(self, first_id, next_id, objects, page_ids, number_ids):
+        self.first_id = first_id
+        self.next_id = next_id
+        self.objects = objects
+        self.page_ids = page_ids
+        self.number_ids = number_ids
+
+
+def serialize_chunk(writer, first_id, number_ids):
+    """把写入器中编号从 first_id 起的对象序列化为 SerializedChunk"""
+    check_reference_recording()
+    objects = []
+    for index in range(first_id - 1, len(writer._objects)):
+        obj = writer._objects[index]
+        if obj is None:
+            continue
+        buffer = _ReferenceRecorder()
+        obj.write_to_stream(buffer)
+        objects.append((index + 1, buffer.getvalue(), buffer.references))
+    page_ids = [page.indirect_reference.idnum for page in writer.pages]
+    return SerializedChunk(first_id, max(first_id, len(writer._objects) + 1), objects, page_ids, number_ids)
+
+
+def release_writer(writer):
+    """写入器与其对象之间互相引用，要等循环垃圾回收才会释放；写出或序列化后直接断开，对象立即释放"""
+    writer._objects.clear()
+    writer.flattened_pages.clear()
+    writer._id_translated.clear()
+
+
+class StreamingPdfWriter:
+    def __init__(self, path):
+        self.path = path
+        self.base = PdfWriter()
+        self.reserved = len(self.base._objects)
+        self.pages_id = self.base.root_object['/Pages'].indirect_reference.idnum
+        self.next_id = self.reserved + 1
+        self.positions = {0: (0, 65535)}
+        self.page_ids = []
+        self.file = open(path, 'wb')
+        self.file.write(PDF_HEADER)
+
+    def new_chunk(self):
+        """返回下一块使用的写入器"""
+        writer = PdfWriter()
+        if len(writer._objects) != self.reserved or writer.root_object['/Pages'].indirect_reference.idnum != self.pages_id:
+            raise Exception("写入器的初始对象与预期不一致，无法流式写出。")
+        writer._objects.extend([None] * (self.next_id - 1 - self.reserved))
+        return writer
+
+    def _write_object(self, idnum, obj):
+        self.positions[idnum] = (self.file.tell(), 0)
+        write_object(self.file, idnum, obj)
+
+    def write_chunk(self, writer):
+        """写出这一块中新建的全部对象；页面的 /Parent 已指向与页面树根相同的编号"""
+        for page in writer.pages:
+            self.page_ids.append(page.indirect_reference.idnum)
+        for index in range(self.next_id - 1, len(writer._objects)):
+            obj = writer._objects[index]
+            if obj is not None:
+                self._write_object(index + 1, obj)
+        self.next_id = max(self.next_id, len(writer._objects) + 1)
+        release_writer(writer)
+
+    def write_serialized(self, chunk):
+        """
+        写出在其他写入器中从 chunk.first_id 起编号、已序列化的一块，编号整体平移到 next_id 起；
+        指向 base 中目录、页面树根等保留对象的引用保持不变。返回平移后的页码内容流编号。
+        """
+        shift = self.next_id - chunk.first_id
+        for idnum, data, references in chunk.objects:
+            if shift:
+                parts, last = [], 0
+                for position, length, target in references:
+                    if target > self.reserved:
+                        parts.append(data[last:position])
+                        parts.append(str(target + shift).encode())
+                        last = position + length
+                parts.append(data[last:])
+                data = b''.join(parts)
+            self._write_object(idnum + shift, data)
+        self.page_ids.extend(idnum + shift for idnum in chunk.page_ids)
+        self.next_id = chunk.next_id + shift
+        return [idnum + shift for idnum in chunk.number_ids]
+
+    def close(self):
+        """写出页面树根、目录、文档信息、交叉引用表和文件尾"""
+        pages = self.base.root_object['/Pages']
+        pages[NameObject('/Kids')] = ArrayObject(IndirectObject(idnum, 0, self.base) for idnum in self.page_ids)
+        pages[NameObject('/Count')] = NumberObject(len(self.page_ids))
+        for index, obj in enumerate(self.base._objects):
+            if obj is not None:
+                self._write_object(index + 1, obj)
+
+        xref_location = self.file.tell()
+        write_xref_table(self.file, self.positions)
+        trailer = DictionaryObject({
+            NameObject('/Size'): NumberObject(max(self.positions) + 1),
+            NameObject('/Root'): self.base.root_object.indirect_reference,
+        })
+        if self.base._info is not None:
+            trailer[NameObject('/Info')] = self.base._info.indirect_reference
+        self.file.write(b"trailer\n")
+        trailer.write_to_stream(self.file)
+        self.file.write(f"\nstartxref\n{xref_location}\n%%EOF\n".encode())
+        self.file.close()
+
+    def abort(self):
+        """出错或取消时关闭并删除写了一半的文件"""
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,175 @@
+"""
+材料列表中的首页缩略图。
+
+PDF 用 QtPdf 渲染第一页，图片用 QImageReader 直接按目标尺寸解码；Word 文档由调用方换成
+转换缓存中上次转换得到的 PDF。两级缓存：
+内存中按材料路径保存最近使用的缩略图，总字节数超过上限时淘汰最久未用的；
+磁盘上按输入指纹（见 manifest.source_fingerprint）保存 PNG，文件被修改后指纹改变，旧缩略图自然不再命中。
+QImage 可以在任意线程中创建和使用，渲染和加载都在后台线程中进行，转换为 QPixmap 只在界面线程中进行。
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from PyQt6.QtCore import Qt, QSize
+from PyQt6.QtGui import QImage, QImageReader
+
+from cache import app_cache_path
+from manifest import source_fingerprint
+
+try:
+    from PyQt6.QtPdf import QPdfDocument
+except ImportError:  # 部分 PyQt6 发行版不含 QtPdf，此时 PDF 不显示缩略图
+    QPdfDocument = None
+
+# 列表中显示的尺寸；按两倍像素渲染，高分屏上也清晰
+THUMBNAIL_SIZE = QSize(36, 48)
+RENDER_SIZE = THUMBNAIL_SIZE * 2
+MEMORY_LIMIT = 16 * 1024 * 1024
+DISK_LIMIT = 5000
+# 每写入这么多个缩略图检查一次磁盘缓存是否超过上限
+PRUNE_INTERVAL = 200
+
+
+def render_pdf_page(pdf_path, size, page=0):
+    if QPdfDocument is None:
+        return None
+    document = QPdfDocument(None)
+    try:
+        if document.load(pdf_path) != QPdfDocument.Error.None_ or document.pageCount() <= page:
+            return None
+        target = document.pagePointSize(page).toSize().scaled(size, Qt.AspectRatioMode.KeepAspectRatio)
+        image = document.render(page, target)
+    finally:
+        document.close()
+    return None if image.isNull() else image
+
+
+def render_image(image_path, size):
+    """JPEG 在解码时直接缩小，不必先解出整张扫描件"""
+    reader = QImageReader(image_path)
+    reader.setAutoTransform(True)
+    original = reader.size()
+    if original.isValid():
+        reader.setScaledSize(original.scaled(size, Qt.AspectRatioMode.KeepAspectRatio))
+    image = reader.read()
+    return None if image.isNull() else image
+
+
+def render_thumbnail(path, size=RENDER_SIZE):
+    """渲染 PDF 的第一页或图片本身；无法渲染时返回 None"""
+    if os.path.splitext(path)[1].lower() == '.pdf':
+        return render_pdf_page(path, size)
+    return render_image(path, size)
+
+
+class ThumbnailCache:
+    """线程安全的两级缩略图缓存；缓存目录不可用时只使用内存"""
+    DIRECTORY_NAME = 'thumbnails'
+
+    def __init__(self, cache_dir=None, memory_limit=MEMORY_LIMIT, disk_limit=DISK_LIMIT, size=RENDER_SIZE):
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.size = size
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.directory = os.path.join(cache_dir, self.DIRECTORY_NAME) if cache_dir else app_cache_path(self.DIRECTORY_NAME)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            print(f"缩略图磁盘缓存不可用: {e}")
+            self.directory = None
+
+    def get(self, path):
+        """只查内存，可在界面线程中绘制时调用"""
+        with self._lock:
+            image = self._images.get(path)
+            if image is not None:
+                self._images.move_to_end(path)
+            return image
+
+    def discard(self, path):
+        """材料被修改、删除或重命名后丢弃内存中的缩略图；磁盘上的旧文件因指纹改变不会再命中"""
+        with self._lock:
+            image = self._images.pop(path, None)
+            if image is not None:
+                self._bytes -= image.sizeInBytes()
+
+    def _remember(self, path, image):
+        with self._lock:
+            old = self._images.pop(path, None)
+            if old is not None:
+                self._bytes -= old.sizeInBytes()
+            self._images[path] = image
+            self._bytes += image.sizeInBytes()
+            while self._bytes > self.memory_limit and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self._bytes -= evicted.sizeInBytes()
+
+    def _disk_path(self, path):
+        if self.directory is None:
+            return None
+        fingerprint = source_fingerprint(path, {'thumbnail': [self.size.width(), self.size.height()]})
+        if fingerprint is None:
+            return None
+        return os.path.join(self.directory, f"{fingerprint}.png")
+
+    def load(self, path, source=None):
+        """
+        在后台线程中调用：依次查内存和磁盘，都没有时渲染 source（默认为材料本身）并写入两级缓存。
+        无法生成缩略图时返回 None。
+        """
+        image = self.get(path)
+        if image is not None:
+            return image
+        disk_path = self._disk_path(path)
+        if disk_path is not None and os.path.exists(disk_path):
+            image = QImage(disk_path)
+            if not image.isNull():
+                try:
+                    os.utime(disk_path)  # 按修改时间淘汰，命中的缩略图保留得更久
+                except OSError:
+                    pass
+                self._remember(path, image)
+                return image
+        if source is None:
+            return None
+        image = render_thumbnail(source, self.size)
+        if image is None:
+            return None
+        self._remember(path, image)
+        if disk_path is not None:
+            self._store(disk_path, image)
+        return image
+
+    def _store(self, disk_path, image):
+        tmp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+        try:
+            if image.save(tmp_path, 'PNG'):
+                os.replace(tmp_path, disk_path)
+        except OSError:
+            pass
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_INTERVAL == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """磁盘上的缩略图超过上限时删除最久未用的"""
+        if self.directory is None:
+            return
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.png')]
+        except OSError:
+            return
+        if len(entries) <= self.disk_limit:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.disk_limit]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass